@@ -1,13 +1,31 @@
 from flask import Flask
 
 from app.api import api
+from app.api_async import api_async
 from app.blueprints.auth import auth
 from app.blueprints.command import command
 from app.blueprints.error import error
 from app.blueprints.post import post
 from app.blueprints.user import user
 from app.config import config
-from app.extensions import bootstrap, db, login, mail, moment, pagedown
+from app.extensions import (
+    async_db,
+    bootstrap,
+    db,
+    follow_graph,
+    fragment_cache,
+    last_seen,
+    login,
+    mail,
+    mail_queue,
+    moment,
+    pagedown,
+    replicas,
+    sql_instrumentation,
+    token_cache,
+    user_cache,
+)
+from app.fragments import comment_fragment, post_fragment
 from app.models import Permission
 
 
@@ -25,10 +43,19 @@ def create_app(config_name="development"):
 def register_extensions(app: Flask):
     bootstrap.init_app(app)
     db.init_app(app)
+    replicas.init_app(app)
+    async_db.init_app(app)
+    sql_instrumentation.init_app(app)
+    follow_graph.init_app(app)
     login.init_app(app)
     mail.init_app(app)
+    mail_queue.init_app(app)
     moment.init_app(app)
     pagedown.init_app(app)
+    token_cache.init_app(app)
+    fragment_cache.init_app(app)
+    user_cache.init_app(app)
+    last_seen.init_app(app)
 
 
 def register_blueprints(app: Flask):
@@ -36,6 +63,7 @@ def register_blueprints(app: Flask):
     app.register_blueprint(error)
     app.register_blueprint(post)
     app.register_blueprint(api, url_prefix="/api")
+    app.register_blueprint(api_async, url_prefix="/api/async")
     app.register_blueprint(user, url_prefix="/user")
     app.register_blueprint(auth, url_prefix="/auth")
 
@@ -43,4 +71,8 @@ def register_blueprints(app: Flask):
 def register_template_context(app: Flask):
     @app.context_processor
     def template_context():
-        return dict(Permission=Permission)
+        return dict(
+            Permission=Permission,
+            post_fragment=post_fragment,
+            comment_fragment=comment_fragment,
+        )
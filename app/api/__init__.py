@@ -2,11 +2,12 @@ from flask import Blueprint, g, request
 
 api = Blueprint("api", __name__)
 
-from app.api import comment, error, post, user  # noqa:F401,E402
+from app.api import comment, error, post, search, token, user  # noqa:F401,E402
 
 
 @api.before_request
 def before_api_request():
+    from app.extensions import replicas
     from app.models import User
 
     if request.json is None:
@@ -14,7 +15,10 @@ def before_api_request():
     token = request.json.get("token")
     if not token:
         return error.unauthorized("Authentication token not provided.")
+    if not isinstance(token, str):
+        return error.unauthorized("Invalid authentication token.")
     current_user = User.check_api_token(token)
     if not current_user:
         return error.unauthorized("Invalid authentication token.")
     g.current_user = current_user
+    replicas.check_pin(current_user.id)
@@ -0,0 +1,22 @@
+from flask import current_app, request
+
+from app.api.error import ValidationError
+
+
+def check_batch_size(items):
+    limit = current_app.config["API_BATCH_SIZE"]
+    if len(items) > limit:
+        raise ValidationError(f"at most {limit} items can be sent at once")
+
+
+def requested_ids():
+    """Return the ids in ``?ids=1,2,3`` in order without repeats, or ``None``."""
+    ids = request.args.get("ids")
+    if ids is None:
+        return None
+    try:
+        ids = list(dict.fromkeys(int(id) for id in ids.split(",") if id.strip()))
+    except ValueError:
+        raise ValidationError("ids must be a comma separated list of integers")
+    check_batch_size(ids)
+    return ids
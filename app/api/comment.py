@@ -1,6 +1,7 @@
 from flask import current_app, request
 
 from app.api import api
+from app.api.fields import requested_embeds, requested_fields
 from app.extensions import db
 from app.models import Comment, Post
 
@@ -11,5 +12,18 @@ def get_post_comments(id):
     page = request.args.get("page", 1, type=int)
     per_page = current_app.config["COMMENTS_PER_PAGE"]
     return Comment.to_json_collection(
-        post.comments.select(), page, per_page, "api.get_post_comments"
+        post.comments.select(),
+        page,
+        per_page,
+        "api.get_post_comments",
+        cursor=request.args.get("cursor"),
+        fields=requested_fields(Comment),
+        embed=requested_embeds(Comment),
+        id=id,
     )
+
+
+@api.get("/comments/<int:id>")
+def get_comment(id):
+    comment = db.get_or_404(Comment, id)
+    return comment.to_json(requested_fields(Comment))
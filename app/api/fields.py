@@ -0,0 +1,27 @@
+from flask import request
+
+from app.api.error import ValidationError
+
+
+def requested_fields(model):
+    """Return the ``model`` fields named in ``?fields=a,b``, or ``None``."""
+    fields = request.args.get("fields")
+    if fields is None:
+        return None
+    fields = {field.strip() for field in fields.split(",") if field.strip()}
+    if not fields:
+        raise ValidationError("fields must name at least one field")
+    unknown = fields - model.json_fields().keys()
+    if unknown:
+        raise ValidationError(f"unknown fields: {', '.join(sorted(unknown))}")
+    return fields
+
+
+def requested_embeds(model):
+    """Return the ``model`` relations named in ``?embed=a,b``."""
+    embed = request.args.get("embed", "")
+    embed = {name.strip() for name in embed.split(",") if name.strip()}
+    unknown = embed - model.json_embeds().keys()
+    if unknown:
+        raise ValidationError(f"unknown embeds: {', '.join(sorted(unknown))}")
+    return embed
@@ -1,41 +1,127 @@
-from flask import g, request, url_for
+from flask import current_app, g, request, stream_with_context, url_for
 
 from app.api import api
+from app.api.batch import check_batch_size, requested_ids
 from app.api.decorators import permission_required
-from app.api.error import forbidden
+from app.api.error import ValidationError, bad_request, forbidden
+from app.api.fields import requested_embeds, requested_fields
+from app.decorators import conditional
 from app.extensions import db
-from app.models import Permission, Post
+from app.models import Comment, Permission, Post, User
+
+NDJSON = "application/x-ndjson"
 
 
 @api.get("/posts")
 def get_posts():
-    posts = db.session.scalars(db.select(Post))
-    return {"posts": [post.to_json() for post in posts]}
+    fields = requested_fields(Post)
+    ids = requested_ids()
+    if ids is not None:
+        return Post.to_json_batch(ids, fields=fields)
+    if request.accept_mimetypes.best_match(["application/json", NDJSON]) == NDJSON:
+        return stream_posts(db.select(Post).order_by(Post.id), fields)
+    return {"posts": list(Post.iter_json(db.select(Post), fields=fields))}
+
+
+def stream_posts(query, fields=None):
+    """Stream posts as newline-delimited JSON, one post per line.
+
+    Rows are fetched ``API_STREAM_BATCH_SIZE`` at a time from a server-side
+    cursor and written out as they are serialized, so memory use and time to
+    first byte don't depend on the size of the table.
+    """
+    batch_size = current_app.config["API_STREAM_BATCH_SIZE"]
+
+    def generate():
+        posts = Post.iter_json(
+            query.execution_options(yield_per=batch_size), fields=fields
+        )
+        for post in posts:
+            yield current_app.json.dumps(post) + "\n"
+
+    return current_app.response_class(stream_with_context(generate()), mimetype=NDJSON)
+
+
+def post_version(id):
+    # Embedded resources are part of the response, so they are part of its
+    # version too.
+    embed = requested_embeds(Post)
+    query = db.select(Post.updated_at).where(Post.id == id)
+    if "author" in embed:
+        query = query.join(User, User.id == Post.author_id).add_columns(
+            User.updated_at, User.last_seen
+        )
+    if "comments" in embed:
+        query = query.add_columns(
+            db.select(db.func.max(Comment.updated_at))
+            .where(Comment.post_id == Post.id)
+            .scalar_subquery()
+        )
+    return db.session.execute(query).first()
 
 
 @api.get("/posts/<int:id>")
+@conditional(post_version)
 def get_post(id):
     post = db.get_or_404(Post, id)
-    return post.to_json()
+    return post.to_json(requested_fields(Post), requested_embeds(Post))
 
 
 @api.post("/posts")
 @permission_required(Permission.WRITE)
 def new_post():
+    fields = requested_fields(Post)
     post = Post.from_json(request.json)
     post.author = g.current_user
     db.session.add(post)
     db.session.commit()
-    return post.to_json(), 201, {"Location": url_for("api.get_post", id=post.id)}
+    return (
+        post.to_json(fields),
+        201,
+        {"Location": url_for("api.get_post", id=post.id)},
+    )
+
+
+@api.post("/posts/batch")
+@permission_required(Permission.WRITE)
+def new_posts():
+    """Create every post of the ``posts`` array, or none of them.
+
+    Invalid posts are reported by their index in the array, and the valid
+    ones are committed together only when there are none.
+    """
+    items = request.json.get("posts")
+    if not isinstance(items, list):
+        return bad_request("posts must be an array")
+    check_batch_size(items)
+    fields = requested_fields(Post)
+    posts, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise ValidationError("post must be an object")
+            posts.append(Post.from_json(item))
+        except ValidationError as e:
+            errors.append({"index": index, "message": e.args[0]})
+    if errors:
+        payload, status_code = bad_request(f"{len(errors)} posts are invalid")
+        payload["errors"] = errors
+        return payload, status_code
+    for post in posts:
+        post.author = g.current_user
+    db.session.add_all(posts)
+    db.session.commit()
+    return {"posts": [post.to_json(fields) for post in posts]}, 201
 
 
 @api.put("/posts/<int:id>")
 @permission_required(Permission.WRITE)
 def update_post(id):
+    fields = requested_fields(Post)
     post = db.get_or_404(Post, id)
     current_user = g.current_user
     if current_user != post.author and not current_user.can(Permission.ADMIN):
         return forbidden("Insufficient permissions")
     post.body = request.json.get("body", post.body)
     db.session.commit()
-    return post.to_json()
+    return post.to_json(fields)
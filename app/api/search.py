@@ -0,0 +1,32 @@
+from flask import current_app, request
+
+from app.api import api
+from app.api.error import bad_request
+from app.api.fields import requested_fields
+from app.models import Comment, Post
+from app.search import matching
+
+
+@api.get("/search")
+def search():
+    q = request.args.get("q", "").strip()
+    kind = request.args.get("kind", "posts")
+    if not q:
+        return bad_request("Search query not provided.")
+    if kind == "comments":
+        model, query = Comment, matching(Comment, q).where(Comment.disabled.isnot(True))
+    elif kind == "posts":
+        model, query = Post, matching(Post, q)
+    else:
+        return bad_request("Unknown search kind.")
+    page = request.args.get("page", 1, type=int)
+    per_page = current_app.config["POSTS_PER_PAGE"]
+    return model.to_json_collection(
+        query,
+        page,
+        per_page,
+        "api.search",
+        fields=requested_fields(model),
+        q=q,
+        kind=kind,
+    )
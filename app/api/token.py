@@ -0,0 +1,11 @@
+from flask import g
+
+from app.api import api
+from app.extensions import db
+
+
+@api.delete("/tokens")
+def revoke_token():
+    g.current_user.revoke_token()
+    db.session.commit()
+    return "", 204
@@ -1,30 +1,79 @@
 from flask import current_app, g, request
 
 from app.api import api
-from app.extensions import db
-from app.models import Post, User
+from app.api.batch import requested_ids
+from app.api.fields import requested_embeds, requested_fields
+from app.decorators import conditional
+from app.extensions import db, follow_graph
+from app.models import Comment, Post, User
 
 
 @api.get("/users")
 def get_users():
+    fields = requested_fields(User)
+    ids = requested_ids()
+    if ids is not None:
+        return User.to_json_batch(ids, fields=fields)
     page = request.args.get("page", 1, type=int)
     per_page = current_app.config["POSTS_PER_PAGE"]
-    return User.to_json_collection(db.select(User), page, per_page, "api.get_users")
+    return User.to_json_collection(
+        db.select(User),
+        page,
+        per_page,
+        "api.get_users",
+        cursor=request.args.get("cursor"),
+        fields=fields,
+    )
+
+
+def user_version(id):
+    return db.session.execute(
+        db.select(User.updated_at, User.last_seen).where(User.id == id)
+    ).first()
+
+
+def user_posts_version(id):
+    embed = requested_embeds(Post)
+    query = db.select(
+        User.updated_at,
+        db.select(db.func.max(Post.updated_at))
+        .where(Post.author_id == User.id)
+        .scalar_subquery(),
+    ).where(User.id == id)
+    if "author" in embed:
+        query = query.add_columns(User.last_seen)
+    if "comments" in embed:
+        query = query.add_columns(
+            db.select(db.func.max(Comment.updated_at))
+            .join(Post, Post.id == Comment.post_id)
+            .where(Post.author_id == User.id)
+            .scalar_subquery()
+        )
+    return db.session.execute(query).first()
 
 
 @api.get("/users/<int:id>")
+@conditional(user_version)
 def get_user(id):
     user = db.get_or_404(User, id)
-    return user.to_json()
+    return user.to_json(requested_fields(User))
 
 
 @api.get("/users/<int:id>/posts")
+@conditional(user_posts_version)
 def get_user_posts(id):
     user = db.get_or_404(User, id)
     page = request.args.get("page", 1, type=int)
     per_page = current_app.config["POSTS_PER_PAGE"]
     return Post.to_json_collection(
-        user.posts.select(), page, per_page, "api.get_user_posts"
+        user.posts.select(),
+        page,
+        per_page,
+        "api.get_user_posts",
+        cursor=request.args.get("cursor"),
+        fields=requested_fields(Post),
+        embed=requested_embeds(Post),
+        id=id,
     )
 
 
@@ -33,29 +82,41 @@ def get_following_posts(id):
     user = db.get_or_404(User, id)
     page = request.args.get("page", 1, type=int)
     per_page = current_app.config["POSTS_PER_PAGE"]
+    timeline = user.home_timeline()
     return Post.to_json_collection(
-        user.following_posts.order_by(Post.timestamp.desc()),
+        timeline.query,
         page,
         per_page,
         "api.get_following_posts",
+        cursor=request.args.get("cursor"),
+        fields=requested_fields(Post),
+        embed=requested_embeds(Post),
+        columns=timeline.columns,
+        id=id,
     )
 
 
+@api.get("/users/<int:id>/suggestions")
+def get_user_suggestions(id):
+    db.get_or_404(User, id)
+    ids = follow_graph.suggestions(id, current_app.config["FOLLOW_SUGGESTIONS"])
+    return {"items": User.to_json_batch(ids, requested_fields(User))["items"]}
+
+
 @api.post("/follow/<int:id>")
 def follow(id):
+    fields = requested_fields(User)
     current_user = g.current_user
     user = db.get_or_404(User, id)
-    if not current_user.is_following(user):
-        current_user.follow(user)
+    if current_user.follow(user):
         db.session.commit()
-    return user.to_json()
+    return user.to_json(fields)
 
 
 @api.delete("/follow/<int:id>")
 def unfollow(id):
     current_user = g.current_user
     user = db.get_or_404(User, id)
-    if current_user.is_following(user):
-        current_user.unfollow(user)
+    if current_user.unfollow(user):
         db.session.commit()
     return "", 204
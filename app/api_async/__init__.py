@@ -0,0 +1,62 @@
+from functools import wraps
+
+from flask import Blueprint, abort, g, request
+from werkzeug.exceptions import HTTPException
+
+from app.api.error import (
+    ValidationError,
+    bad_request,
+    error_response,
+    handle_exception,
+    unauthorized,
+    validation_error,
+)
+from app.extensions import async_db
+
+api_async = Blueprint("api_async", __name__)
+api_async.register_error_handler(HTTPException, handle_exception)
+api_async.register_error_handler(ValidationError, validation_error)
+
+
+def api_view(f):
+    """Run the async view ``f`` with a session on the async engine.
+
+    The session is passed as the first argument. Tokens are checked as in
+    ``before_api_request``, but here rather than in a ``before_request`` hook,
+    since Flask runs every hook in an event loop of its own and the session
+    has to stay in the view's.
+    """
+
+    @wraps(f)
+    async def inner(*args, **kwargs):
+        from app.models import User
+
+        if async_db.engine is None:
+            return error_response(503, "Async database not configured.")
+        if request.json is None:
+            return bad_request("Invalid json in body.")
+        token = request.json.get("token")
+        if not token:
+            return unauthorized("Authentication token not provided.")
+        if not isinstance(token, str):
+            return unauthorized("Invalid authentication token.")
+        async with async_db.session() as session:
+            current_user = await session.run_sync(
+                lambda sync_session: User.check_api_token(token, session=sync_session)
+            )
+            if not current_user:
+                return unauthorized("Invalid authentication token.")
+            g.current_user = current_user
+            return await f(session, *args, **kwargs)
+
+    return inner
+
+
+async def get_or_404(session, model, id):
+    instance = await session.get(model, id)
+    if instance is None:
+        abort(404)
+    return instance
+
+
+from app.api_async import post, user  # noqa:F401,E402
@@ -0,0 +1,21 @@
+from app.api.fields import requested_embeds, requested_fields
+from app.api_async import api_async, api_view, get_or_404
+from app.extensions import db
+from app.models import Post
+
+
+@api_async.get("/posts")
+@api_view
+async def get_posts(session):
+    fields = requested_fields(Post)
+    serialize = Post.json_serializer(fields)
+    rows = await session.execute(Post.json_query(db.select(Post), fields))
+    return {"posts": [serialize(row) for row in rows]}
+
+
+@api_async.get("/posts/<int:id>")
+@api_view
+async def get_post(session, id):
+    post = await get_or_404(session, Post, id)
+    fields, embed = requested_fields(Post), requested_embeds(Post)
+    return await session.run_sync(lambda _: post.to_json(fields, embed))
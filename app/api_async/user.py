@@ -0,0 +1,78 @@
+from flask import current_app, g, request
+
+from app.api.fields import requested_embeds, requested_fields
+from app.api_async import api_async, api_view, get_or_404
+from app.models import Post, User
+
+# Pagination and the model methods used below run their queries through the
+# sync ORM, so they are called with ``run_sync``, which still awaits every
+# statement on the async connection.
+
+
+@api_async.get("/users/<int:id>/posts")
+@api_view
+async def get_user_posts(session, id):
+    user = await get_or_404(session, User, id)
+    page = request.args.get("page", 1, type=int)
+    per_page = current_app.config["POSTS_PER_PAGE"]
+    cursor = request.args.get("cursor")
+    fields, embed = requested_fields(Post), requested_embeds(Post)
+    return await session.run_sync(
+        lambda sync_session: Post.to_json_collection(
+            user.posts.select(),
+            page,
+            per_page,
+            "api_async.get_user_posts",
+            cursor=cursor,
+            session=sync_session,
+            fields=fields,
+            embed=embed,
+            id=id,
+        )
+    )
+
+
+@api_async.get("/users/<int:id>/following-posts")
+@api_view
+async def get_following_posts(session, id):
+    user = await get_or_404(session, User, id)
+    page = request.args.get("page", 1, type=int)
+    per_page = current_app.config["POSTS_PER_PAGE"]
+    cursor = request.args.get("cursor")
+    fields, embed = requested_fields(Post), requested_embeds(Post)
+    timeline = await session.run_sync(lambda _: user.home_timeline())
+    return await session.run_sync(
+        lambda sync_session: Post.to_json_collection(
+            timeline.query,
+            page,
+            per_page,
+            "api_async.get_following_posts",
+            cursor=cursor,
+            session=sync_session,
+            fields=fields,
+            embed=embed,
+            columns=timeline.columns,
+            id=id,
+        )
+    )
+
+
+@api_async.post("/follow/<int:id>")
+@api_view
+async def follow(session, id):
+    fields = requested_fields(User)
+    current_user = g.current_user
+    user = await get_or_404(session, User, id)
+    if await session.run_sync(lambda _: current_user.follow(user)):
+        await session.commit()
+    return user.to_json(fields)
+
+
+@api_async.delete("/follow/<int:id>")
+@api_view
+async def unfollow(session, id):
+    current_user = g.current_user
+    user = await get_or_404(session, User, id)
+    if await session.run_sync(lambda _: current_user.unfollow(user)):
+        await session.commit()
+    return "", 204
@@ -0,0 +1,50 @@
+import sqlalchemy as sa
+from flask import current_app
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+
+def async_url(url):
+    """Return the async driver URL for a sync SQLite ``url``, or ``None``."""
+    url = sa.make_url(url)
+    if url.drivername not in ("sqlite", "sqlite+pysqlite") or url.database in (
+        None,
+        "",
+        ":memory:",
+    ):
+        return None
+    return url.set(drivername="sqlite+aiosqlite")
+
+
+class AsyncDatabase:
+    """An async engine on the app's database for the ``api_async`` blueprint.
+
+    The engine connects to ``SQLALCHEMY_ASYNC_DATABASE_URI``, or to the
+    ``SQLALCHEMY_DATABASE_URI`` SQLite file through aiosqlite when that is
+    unset. Flask runs every async view in an event loop of its own, and
+    pooled connections can't move between loops, so connections are opened
+    per session instead of pooled.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        url = app.config["SQLALCHEMY_ASYNC_DATABASE_URI"] or async_url(
+            app.config["SQLALCHEMY_DATABASE_URI"]
+        )
+        app.extensions["async_db"] = (
+            create_async_engine(url, poolclass=sa.NullPool) if url else None
+        )
+
+    @property
+    def engine(self):
+        return current_app.extensions["async_db"]
+
+    def session(self):
+        """Return a new session on the async engine.
+
+        Objects stay loaded after commit, since touching an expired
+        attribute would need a query outside of an ``await``.
+        """
+        return AsyncSession(self.engine, expire_on_commit=False)
@@ -0,0 +1,104 @@
+import re
+
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+from flask import current_app
+
+from app.extensions import db
+from app.models import Comment, Post, User
+from app.search import matching
+
+FULL_SCAN = re.compile(r"^SCAN (?!\S+ VIRTUAL TABLE)")
+TEMP_SORT = re.compile(r"USE TEMP B-TREE")
+
+# Plan lines that are fine for a given query. Unfiltered newest-first pages
+# walk the timestamp index and stop after one page. Timelines that merge
+# popular authors on read sort at most TIMELINE_LENGTH posts per author on
+# top of the stored timeline, whatever the size of the post table.
+EXPECTED = {
+    "posts": {"SCAN post USING INDEX ix_post_timestamp"},
+    "moderated comments": {"SCAN comment USING INDEX ix_comment_timestamp"},
+    "following posts with popular authors": {
+        "UNION USING TEMP B-TREE",
+        "SCAN latest",
+        "SCAN entries",
+        "USE TEMP B-TREE FOR ORDER BY",
+    },
+}
+
+
+def sample(model, id=1):
+    """Return a detached ``model`` instance with only its primary key set."""
+    instance = model.__mapper__.class_manager.new_instance()
+    so.attributes.set_committed_value(instance, "id", id)
+    so.make_transient_to_detached(instance)
+    return instance
+
+
+def hot_queries():
+    """Yield ``(name, query)`` for the queries behind the busiest views."""
+    user, post = sample(User), sample(Post)
+    posts_per_page = current_app.config["POSTS_PER_PAGE"]
+    comments_per_page = current_app.config["COMMENTS_PER_PAGE"]
+    follows_per_page = current_app.config["FOLLOWS_PER_PAGE"]
+    latest_posts = (Post.timestamp.desc(), Post.id.desc())
+    latest_comments = (Comment.timestamp.desc(), Comment.id.desc())
+    yield "user by username", db.select(User).filter_by(username="susan")
+    yield "user by token", db.select(User).filter_by(token="0" * 32)
+    yield "posts", db.select(Post).order_by(*latest_posts).limit(posts_per_page)
+    yield "following posts", user.following_posts.limit(posts_per_page)
+    yield "following posts with popular authors", user.home_timeline(
+        popular=[2, 3]
+    ).query.limit(posts_per_page)
+    yield "user posts", user.posts.select().order_by(*latest_posts).limit(
+        posts_per_page
+    )
+    yield "post comments", post.comments.select().order_by(*latest_comments).limit(
+        comments_per_page
+    )
+    yield "moderated comments", db.select(Comment).order_by(*latest_comments).limit(
+        comments_per_page
+    )
+    yield "following", user.following.select().limit(follows_per_page)
+    yield "followers", user.followed.select().limit(follows_per_page)
+    yield "is following", user.following.select().filter_by(id=2)
+    yield "is followed by", user.followed.select().filter_by(id=2)
+    yield "user posts version", db.select(db.func.max(Post.updated_at)).where(
+        Post.author_id == user.id
+    )
+    yield "post comments version", db.select(db.func.max(Comment.updated_at)).where(
+        Comment.post_id == post.id
+    )
+    yield "search posts", matching(Post, "flask").limit(posts_per_page)
+    yield "search comments", matching(Comment, "flask").limit(comments_per_page)
+
+
+def explain(query):
+    """Return the ``EXPLAIN QUERY PLAN`` lines of ``query`` on SQLite."""
+
+    def before_cursor_execute(conn, cursor, statement, parameters, *args):
+        return f"EXPLAIN QUERY PLAN {statement}", parameters
+
+    with db.engine.connect() as connection:
+        sa.event.listen(
+            connection, "before_cursor_execute", before_cursor_execute, retval=True
+        )
+        result = connection.execute(query)
+        return [row[-1] for row in result.cursor.fetchall()]
+
+
+def audit():
+    """Yield ``(name, plan, problems)`` for every hot query.
+
+    Problems are the plan lines showing a full table scan or a sort in a
+    temporary B-tree, other than those listed in ``EXPECTED``.
+    """
+    for name, query in hot_queries():
+        plan = explain(query)
+        problems = [
+            line
+            for line in plan
+            if (FULL_SCAN.search(line) or TEMP_SORT.search(line))
+            and line not in EXPECTED.get(name, ())
+        ]
+        yield name, plan, problems
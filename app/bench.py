@@ -0,0 +1,226 @@
+import random
+import re
+import statistics
+from datetime import datetime, timezone
+from time import perf_counter
+
+from faker import Faker
+
+from app.extensions import db
+from app.fake import FakeData
+from app.models import Post, Role, User, follow
+
+QUERY_COUNT = re.compile(r'\bdb;[^,]*desc="(\d+) queries"')
+
+
+class Benchmark:
+    """Drive the busiest endpoints of ``app`` through its test client.
+
+    ``seed_data`` replaces the app's database with a generated dataset sized
+    by ``scale``, and ``run`` times ``requests`` requests per endpoint after
+    ``warmup`` untimed ones, counting the SQL statements they execute from
+    the ``Server-Timing`` header of each response. The same ``seed`` gives
+    the same data and the same request sequence.
+    """
+
+    def __init__(self, app, scale=1.0, requests=200, warmup=20, seed=0):
+        self.app = app
+        self.scale = scale
+        self.requests = requests
+        self.warmup = warmup
+        self.seed = seed
+        self.random = random.Random(seed)
+
+    def seed_data(self):
+        random.seed(self.seed)
+        Faker.seed(self.seed)
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+            Role.insert_roles()
+            data = FakeData()
+            data.users(int(200 * self.scale))
+            data.posts(int(2000 * self.scale))
+            data.follows(20)
+            data.comments(int(4000 * self.scale))
+            data.rebuild()
+            self.users = db.session.execute(
+                db.select(User.id, User.username, User.email).order_by(User.id)
+            ).all()
+            self.post_ids = db.session.scalars(db.select(Post.id)).all()
+            self.tokens = {
+                user.id: db.session.get(User, user.id).get_api_token(expires_in=3600)
+                for user in self.users[:10]
+            }
+            # follow.followed_id holds the follower, following_id the followee.
+            self.following = {
+                user.id: set(
+                    db.session.scalars(
+                        db.select(follow.c.following_id).where(
+                            follow.c.followed_id == user.id
+                        )
+                    )
+                )
+                for user in self.users[:3]
+            }
+
+    def scenarios(self):
+        """Return ``{name: request}`` where ``request`` takes a test client."""
+        users, post_ids, tokens = self.users, self.post_ids, self.tokens
+        pick = self.random.choice
+
+        def token(user_id):
+            return {"token": tokens[user_id]}
+
+        def toggle(user_id):
+            # Follow a random user, or unfollow them if already followed.
+            target = pick(users[10:])
+            following = self.following[user_id]
+            following ^= {target.id}
+            return target, target.id in following
+
+        def follow(client):
+            target, add = toggle(users[0].id)
+            action = "follow" if add else "unfollow"
+            return client.get(f"/user/{action}/{target.username}")
+
+        def api_follow(prefix, user_id):
+            def request(client):
+                target, add = toggle(user_id)
+                method = client.post if add else client.delete
+                return method(f"{prefix}/follow/{target.id}", json=token(user_id))
+
+            return request
+
+        def api(prefix):
+            return {
+                "posts": lambda client: client.get(
+                    f"{prefix}/posts", json=token(pick(list(tokens)))
+                ),
+                "post": lambda client: client.get(
+                    f"{prefix}/posts/{pick(post_ids)}", json=token(pick(list(tokens)))
+                ),
+                "following posts": lambda client: client.get(
+                    f"{prefix}/users/{pick(list(tokens))}/following-posts",
+                    json=token(pick(list(tokens))),
+                ),
+            }
+
+        scenarios = {
+            "index": lambda client: client.get("/"),
+            "post": lambda client: client.get(f"/post/{pick(post_ids)}"),
+            "user": lambda client: client.get(f"/user/{pick(users).username}"),
+            **{f"api {name}": request for name, request in api("/api").items()},
+            "follow": follow,
+            "api follow": api_follow("/api", users[1].id),
+        }
+        # The async API needs a database both engines can open.
+        if self.app.extensions["async_db"] is not None:
+            scenarios.update(
+                {
+                    f"async api {name}": request
+                    for name, request in api("/api/async").items()
+                }
+            )
+            scenarios["async api follow"] = api_follow("/api/async", users[2].id)
+        return scenarios
+
+    def client(self):
+        client = self.app.test_client(use_cookies=True)
+        user = self.users[0]
+        client.post("/auth/login", data={"email": user.email, "password": "123"})
+        return client
+
+    def run(self):
+        return {
+            name: self.measure(scenario) for name, scenario in self.scenarios().items()
+        }
+
+    def measure(self, scenario):
+        client = self.client()
+        for _ in range(self.warmup):
+            scenario(client)
+        latencies = []
+        statements = 0
+        for _ in range(self.requests):
+            start = perf_counter()
+            response = scenario(client)
+            latencies.append(perf_counter() - start)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{response.request.path}: {response.status}")
+            statements += query_count(response)
+        percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+        return {
+            "requests": self.requests,
+            "requests_per_second": self.requests / sum(latencies),
+            "p50_ms": percentiles[49] * 1000,
+            "p95_ms": percentiles[94] * 1000,
+            "p99_ms": percentiles[98] * 1000,
+            "queries_per_request": statements / self.requests,
+        }
+
+    def serialization(self, rounds=10):
+        """Return the milliseconds per 1000 items to serialize API collections.
+
+        Each model is timed loading instances and calling ``to_json``, and
+        reading rows of ``json_columns`` for ``json_serializer``, taking the
+        best of ``rounds`` runs over up to 1000 items.
+        """
+        results = {}
+        with self.app.test_request_context():
+            for model in (User, Post):
+                query = db.select(model).limit(1000)
+
+                def instances():
+                    db.session.expunge_all()
+                    return [item.to_json() for item in db.session.scalars(query)]
+
+                def rows():
+                    return list(model.iter_json(query))
+
+                results[model.__tablename__] = {
+                    name: self.time_per_1000(serialize, rounds)
+                    for name, serialize in (("instances", instances), ("rows", rows))
+                }
+        return results
+
+    @staticmethod
+    def time_per_1000(serialize, rounds):
+        best, count = float("inf"), 0
+        for _ in range(rounds):
+            start = perf_counter()
+            count = len(serialize())
+            best = min(best, perf_counter() - start)
+        return best * 1000 * 1000 / max(count, 1)
+
+    def report(self, results, serialization=None):
+        return {
+            "date": datetime.now(timezone.utc).isoformat(),
+            "scale": self.scale,
+            "requests": self.requests,
+            "seed": self.seed,
+            "endpoints": results,
+            "serialization": serialization,
+        }
+
+
+def query_count(response):
+    """Return the SQL statement count ``SQLInstrumentation`` sent in ``response``."""
+    match = QUERY_COUNT.search(response.headers.get("Server-Timing", ""))
+    if match is None:
+        raise RuntimeError("SQL_INSTRUMENTATION must be enabled to count queries")
+    return int(match.group(1))
+
+
+def compare(results, baseline):
+    """Yield one line per endpoint comparing ``results`` with ``baseline``."""
+    for name, current in results["endpoints"].items():
+        previous = baseline["endpoints"].get(name)
+        if previous is None:
+            continue
+        changes = [
+            f"{key} {(current[key] / previous[key] - 1) * 100:+.1f}%"
+            for key in ("requests_per_second", "p95_ms", "queries_per_request")
+            if previous[key]
+        ]
+        yield f"{name}: {', '.join(changes)}"
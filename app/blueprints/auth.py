@@ -3,6 +3,7 @@ from urllib.parse import urlsplit
 from flask import Blueprint, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required, login_user, logout_user
 
+from app.decorators import use_primary
 from app.email import send_confirmation_mail
 from app.extensions import db
 from app.forms import RegistrationForm, loginForm
@@ -45,6 +46,7 @@ def register():
 
 @auth.get("/confirm/<token>")
 @login_required
+@use_primary
 def confirm(token):
     if current_user.confirmed:
         return redirect(url_for("post.index"))
@@ -1,13 +1,10 @@
-from random import randint
-
 import click
 import sqlalchemy as sa
-from faker import Faker
 from flask import Blueprint, current_app
-from sqlalchemy.exc import IntegrityError
 
 from app.extensions import db
-from app.models import Post, Role, User
+from app.models import Comment, Post, Role, User
+from app.renderer import COMMENT_TAGS, POST_TAGS, render_many, render_pool
 
 command = Blueprint("command", __name__, cli_group=None)
 
@@ -34,39 +31,102 @@ def initdb():
 @command.cli.command()
 @click.argument("user_count", default=20)
 @click.argument("post_count", default=100)
-def fake(user_count, post_count):
+@click.option("--follows", default=10, help="Average users followed per user.")
+@click.option("--comments", default=200, help="Comments to create.")
+@click.option("--skew", default=2.0, help="Power-law skew, 1 is uniform.")
+@click.option("--chunk-size", default=5000, help="Rows inserted per statement.")
+@click.option("--processes", type=int, help="Render with this many processes.")
+def fake(user_count, post_count, follows, comments, skew, chunk_size, processes):
     """Generate fake data."""
-    faker = Faker()
-    i = 0
-    while i < user_count:
-        user = User(
-            email=faker.email(),
-            username=faker.user_name(),
-            password="123",
-            confirmed=True,
-            name=faker.name(),
-            location=faker.city(),
-            about_me=faker.text(),
-            member_since=faker.past_date(),
-        )
-        db.session.add(user)
-        try:
-            db.session.commit()
-            i += 1
-        except IntegrityError:
-            db.session.rollback()
-    print(f"{user_count} users created.")
-
-    user_count = db.session.scalar(db.select(sa.func.count(User.id)))
-    for i in range(post_count):
-        post = Post(
-            body=faker.text(),
-            timestamp=faker.past_date(),
-            author=db.session.get(User, randint(1, user_count)),
-        )
-        db.session.add(post)
-    db.session.commit()
-    print(f"{post_count} posts created.")
+    from contextlib import nullcontext
+
+    from app.fake import FakeData
+
+    with render_pool(processes) if processes else nullcontext() as executor:
+        data = FakeData(chunk_size=chunk_size, skew=skew, executor=executor)
+        data.users(user_count)
+        print(f"{user_count} users created.")
+        data.posts(post_count)
+        print(f"{post_count} posts created.")
+        data.follows(follows)
+        print("Follows created.")
+        data.comments(comments)
+        print(f"{comments} comments created.")
+        data.rebuild()
+        print("Counters, timelines and search indexes rebuilt.")
+
+
+@command.cli.command()
+@click.option("--chunk-size", default=1000, help="Rows updated per transaction.")
+def recount(chunk_size):
+    """Rebuild the denormalized counters."""
+    User.recount(chunk_size)
+    print("User counters rebuilt.")
+    Post.recount(chunk_size)
+    print("Post counters rebuilt.")
+
+
+@command.cli.command()
+@click.option("--chunk-size", default=1000, help="Users rebuilt per transaction.")
+def rebuild_timelines(chunk_size):
+    """Rebuild the materialized home timelines."""
+    User.rebuild_timelines(chunk_size)
+    print("Timelines rebuilt.")
+
+
+@command.cli.command()
+@click.option("--chunk-size", default=1000, help="Rows rendered per batch.")
+@click.option("--processes", type=int, help="Worker processes, default CPU count.")
+def rerender(chunk_size, processes):
+    """Re-render the HTML of all posts and comments."""
+    with render_pool(processes) as executor:
+        for model, tags in ((Post, POST_TAGS), (Comment, COMMENT_TAGS)):
+            last_id = db.session.scalar(db.select(sa.func.max(model.id))) or 0
+            for start in range(0, last_id, chunk_size):
+                rows = db.session.execute(
+                    db.select(model.id, model.body).where(
+                        model.id > start, model.id <= start + chunk_size
+                    )
+                ).all()
+                if not rows:
+                    continue
+                html = render_many([row.body for row in rows], tags, executor)
+                db.session.execute(
+                    db.update(model),
+                    [
+                        {"id": row.id, "body_html": body_html}
+                        for row, body_html in zip(rows, html)
+                    ],
+                )
+                db.session.commit()
+            print(f"{model.__tablename__} rendered.")
+
+
+@command.cli.command()
+@click.option("--chunk-size", default=5000, help="Rows indexed per transaction.")
+def reindex(chunk_size):
+    """Rebuild the full-text search indexes."""
+    from app.search import rebuild
+
+    rebuild(chunk_size)
+    print("Search indexes rebuilt.")
+
+
+@command.cli.command()
+@click.option("--verbose", is_flag=True, help="Print the plan of every query.")
+def query_audit(verbose):
+    """Flag full scans and temporary sorts in the plans of hot queries."""
+    from app.audit import audit
+
+    failed = 0
+    for name, plan, problems in audit():
+        failed += bool(problems)
+        print(f"{'FAIL' if problems else 'ok':<4}  {name}")
+        if problems or verbose:
+            for line in plan:
+                print(f"  {'!' if line in problems else ' '} {line}")
+    if failed:
+        raise click.ClickException(f"{failed} queries need an index.")
 
 
 @command.cli.command()
@@ -80,6 +140,84 @@ def email():
     )
 
 
+@command.cli.command()
+@click.option("--count", default=200, help="Messages sent by each strategy.")
+def mail_bench(count):
+    """Compare thread-per-message and queued mail against the email server."""
+    from threading import Thread
+    from time import perf_counter
+
+    from flask_mailman import EmailMessage
+
+    from app.extensions import mail_queue
+
+    def messages():
+        return [
+            EmailMessage("Benchmark", f"Message {i}", to=[f"user{i}@example.com"])
+            for i in range(count)
+        ]
+
+    def send(app, message):
+        with app.app_context():
+            message.send()
+
+    app = current_app._get_current_object()
+    start = perf_counter()
+    threads = [Thread(target=send, args=(app, m)) for m in messages()]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = perf_counter() - start
+    print(f"thread per message: {count / elapsed:.1f} msg/s")
+
+    start = perf_counter()
+    for message in messages():
+        mail_queue.put(message)
+    mail_queue.join()
+    elapsed = perf_counter() - start
+    print(f"mail queue: {count / elapsed:.1f} msg/s")
+    print(mail_queue.metrics())
+
+
+@command.cli.command()
+@click.option("--scale", default=1.0, help="Dataset size, 1 is 200 users.")
+@click.option("--requests", default=200, help="Timed requests per endpoint.")
+@click.option("--warmup", default=20, help="Untimed requests per endpoint.")
+@click.option("--seed", default=0, help="Seed of the data and the requests.")
+@click.option("--output", type=click.File("w"), help="Write the results as JSON.")
+@click.option("--compare", type=click.File(), help="JSON results to compare with.")
+def bench(scale, requests, warmup, seed, output, compare):
+    """Benchmark the busiest endpoints against a generated database."""
+    import json
+
+    from app import create_app
+    from app.bench import Benchmark
+    from app.bench import compare as compare_results
+
+    benchmark = Benchmark(create_app("benchmark"), scale, requests, warmup, seed)
+    benchmark.seed_data()
+    results = benchmark.report(benchmark.run(), benchmark.serialization())
+    for name, result in results["endpoints"].items():
+        print(
+            f"{name:<20} {result['requests_per_second']:8.1f} req/s"
+            f"  p50 {result['p50_ms']:6.1f} ms"
+            f"  p95 {result['p95_ms']:6.1f} ms"
+            f"  p99 {result['p99_ms']:6.1f} ms"
+            f"  {result['queries_per_request']:5.1f} queries"
+        )
+    for name, result in results["serialization"].items():
+        print(
+            f"serialize {name:<10} {result['instances']:8.2f} ms/1000 instances"
+            f"  {result['rows']:8.2f} ms/1000 rows"
+        )
+    if output:
+        json.dump(results, output, indent=2)
+    if compare:
+        for line in compare_results(results, json.load(compare)):
+            print(line)
+
+
 @command.cli.command()
 def test():
     """Run the unit tests."""
@@ -1,5 +1,4 @@
-from datetime import datetime, timezone
-
+import sqlalchemy.orm as so
 from flask import (
     Blueprint,
     abort,
@@ -13,10 +12,13 @@ from flask import (
 )
 from flask_login import current_user, login_required
 
-from app.decorators import permission_required
-from app.extensions import db
+from app.decorators import conditional, permission_required, use_primary
+from app.extensions import db, last_seen
+from app.feed import load_comments, load_posts, paginate_comments, paginate_posts
 from app.forms import CommentForm, PostForm
-from app.models import Comment, Permission, Post
+from app.fragments import invalidate_comment
+from app.models import Comment, Permission, Post, User
+from app.search import matching
 
 post = Blueprint("post", __name__)
 
@@ -24,8 +26,7 @@ post = Blueprint("post", __name__)
 @post.before_app_request
 def before_app_request():
     if current_user.is_authenticated:
-        current_user.last_seen = datetime.now(timezone.utc)
-        db.session.commit()
+        last_seen.touch(current_user)
         if (
             not current_user.confirmed
             and request.blueprint != "auth"
@@ -47,12 +48,12 @@ def index():
     if current_user.is_authenticated:
         show_following = bool(request.cookies.get("show_following", ""))
     if show_following:
-        query = current_user.following_posts
+        timeline = current_user.home_timeline()
+        query, columns = timeline.query, timeline.columns
     else:
-        query = db.select(Post)
-    posts = db.paginate(
-        query.order_by(Post.timestamp.desc()),
-        per_page=current_app.config["POSTS_PER_PAGE"],
+        query, columns = db.select(Post).order_by(Post.timestamp.desc()), None
+    posts = paginate_posts(
+        query, per_page=current_app.config["POSTS_PER_PAGE"], columns=columns
     )
     return render_template(
         "index.html", form=form, posts=posts, show_following=show_following
@@ -75,9 +76,29 @@ def show_following():
     return res
 
 
+def post_version(id):
+    commenter = so.aliased(User)
+    return db.session.execute(
+        db.select(
+            Post.updated_at,
+            User.updated_at,
+            db.select(db.func.max(Comment.updated_at))
+            .where(Comment.post_id == Post.id)
+            .scalar_subquery(),
+            db.select(db.func.max(commenter.updated_at))
+            .join(Comment, Comment.author_id == commenter.id)
+            .where(Comment.post_id == Post.id)
+            .scalar_subquery(),
+        )
+        .join(Post.author)
+        .where(Post.id == id)
+    ).first()
+
+
 @post.route("/post/<int:id>", methods=["GET", "POST"])
+@conditional(post_version, private=True)
 def get_post(id):
-    post = db.get_or_404(Post, id)
+    post = db.first_or_404(load_posts(db.select(Post).filter_by(id=id)))
     form = CommentForm()
     if form.validate_on_submit():
         comment = Comment(
@@ -87,7 +108,7 @@ def get_post(id):
         db.session.commit()
         flash("Your comment has been published.")
         return redirect(url_for("post.get_post", id=post.id))
-    comments = db.paginate(
+    comments = paginate_comments(
         post.comments.select().order_by(Comment.timestamp.desc()),
         per_page=current_app.config["COMMENTS_PER_PAGE"],
     )
@@ -96,6 +117,26 @@ def get_post(id):
     )
 
 
+@post.get("/search")
+def search():
+    q = request.args.get("q", "").strip()
+    kind = request.args.get("kind", "posts")
+    if kind not in ("posts", "comments"):
+        abort(404)
+    results = None
+    if q:
+        if kind == "comments":
+            query = load_comments(
+                matching(Comment, q).where(Comment.disabled.isnot(True))
+            )
+            per_page = current_app.config["COMMENTS_PER_PAGE"]
+        else:
+            query = load_posts(matching(Post, q))
+            per_page = current_app.config["POSTS_PER_PAGE"]
+        results = db.paginate(query, per_page=per_page)
+    return render_template("post/search.html", q=q, kind=kind, results=results)
+
+
 @post.route("/edit/<int:id>", methods=["GET", "POST"])
 @login_required
 def edit_post(id):
@@ -116,7 +157,7 @@ def edit_post(id):
 @login_required
 @permission_required(Permission.MODERATE)
 def moderate():
-    comments = db.paginate(
+    comments = paginate_comments(
         db.select(Comment).order_by(Comment.timestamp.desc()),
         per_page=current_app.config["COMMENTS_PER_PAGE"],
     )
@@ -126,18 +167,22 @@ def moderate():
 @post.get("/moderate/enable/<int:id>")
 @login_required
 @permission_required(Permission.MODERATE)
+@use_primary
 def moderate_enable(id):
     comment = db.get_or_404(Comment, id)
     comment.disabled = False
     db.session.commit()
+    invalidate_comment(comment.id)
     return redirect(url_for("post.moderate"))
 
 
 @post.get("/moderate/disable/<int:id>")
 @login_required
 @permission_required(Permission.MODERATE)
+@use_primary
 def moderate_disable(id):
     comment = db.get_or_404(Comment, id)
     comment.disabled = True
     db.session.commit()
+    invalidate_comment(comment.id)
     return redirect(url_for("post.moderate"))
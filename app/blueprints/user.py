@@ -8,18 +8,37 @@ from flask import (
 )
 from flask_login import current_user, login_required
 
-from app.decorators import admin_required, permission_required
+from app.decorators import (
+    admin_required,
+    conditional,
+    permission_required,
+    use_primary,
+)
 from app.extensions import db
+from app.feed import paginate_posts
 from app.forms import EditProfileAdmminForm, EditProfileForm
 from app.models import Permission, Post, Role, User
 
 user = Blueprint("user", __name__)
 
 
+def user_version(username):
+    return db.session.execute(
+        db.select(
+            User.updated_at,
+            User.last_seen,
+            db.select(db.func.max(Post.updated_at))
+            .where(Post.author_id == User.id)
+            .scalar_subquery(),
+        ).where(User.username == username)
+    ).first()
+
+
 @user.get("/<username>")
+@conditional(user_version, private=True)
 def index(username):
     user = db.first_or_404(db.select(User).filter_by(username=username))
-    posts = db.paginate(
+    posts = paginate_posts(
         user.posts.select().order_by(Post.timestamp.desc()),
         per_page=current_app.config["POSTS_PER_PAGE"],
     )
@@ -73,15 +92,15 @@ def edit_profile_admin(id):
 @user.get("/follow/<username>")
 @login_required
 @permission_required(Permission.FOLLOW)
+@use_primary
 def follow(username):
     user = db.session.scalar(db.select(User).filter_by(username=username))
     if user is None:
         flash("Invalid user.", "warning")
         return redirect(url_for("post.index"))
-    if current_user.is_following(user):
+    if not current_user.follow(user):
         flash("You are already following this user.")
         return redirect(url_for("user.index", username=username))
-    current_user.follow(user)
     db.session.commit()
     flash(f"You are now following {username}.")
     return redirect(url_for("user.index", username=username))
@@ -90,15 +109,15 @@ def follow(username):
 @user.get("/unfollow/<username>")
 @login_required
 @permission_required(Permission.FOLLOW)
+@use_primary
 def unfollow(username):
     user = db.session.scalar(db.select(User).filter_by(username=username))
     if user is None:
         flash("Invalid user.", "warning")
         return redirect(url_for("post.index"))
-    if not current_user.is_following(user):
+    if not current_user.unfollow(user):
         flash("You are not following this user.")
         return redirect(url_for("user.index", username=username))
-    current_user.unfollow(user)
     db.session.commit()
     flash(f"You are not following {username} anymore.")
     return redirect(url_for("user.index", username=username))
@@ -130,3 +149,9 @@ def followed_by(username):
     return render_template(
         "user/follows.html", title="Followed by", user=user, follows=follows
     )
+
+
+@user.get("/suggestions")
+@login_required
+def suggestions():
+    return render_template("user/suggestions.html", users=current_user.suggestions())
@@ -0,0 +1,100 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+from flask import current_app
+
+
+class LRUCache:
+    """A thread-safe mapping that keeps the ``maxsize`` most recently used keys.
+
+    With ``ttl`` set, entries also expire that many seconds after being stored.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires = self._data[key]
+            except KeyError:
+                return default
+            if expires is not None and expires < monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires = monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            value, _ = self._data.pop(key, (default, None))
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class Cache:
+    """Keep one ``LRUCache`` per application, sized from the app config."""
+
+    def __init__(self, name, size_key, ttl_key=None, app=None):
+        self.name = name
+        self.size_key = size_key
+        self.ttl_key = ttl_key
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        ttl = app.config[self.ttl_key] if self.ttl_key else None
+        app.extensions[self.name] = LRUCache(app.config[self.size_key], ttl)
+
+    @property
+    def store(self):
+        return current_app.extensions[self.name]
+
+    def get(self, key, default=None):
+        return self.store.get(key, default)
+
+    def set(self, key, value):
+        self.store.set(key, value)
+
+    def pop(self, key, default=None):
+        return self.store.pop(key, default)
+
+    def clear(self):
+        self.store.clear()
+
+
+def snapshot(instance):
+    """Return a detached copy of the column values loaded on ``instance``.
+
+    The copy is safe to share between threads and to put in a cache; attach
+    it to a session with ``session.merge(copy, load=False)``, which costs no
+    query and gives that session its own instance to read and write.
+    """
+    state = sa.inspect(instance)
+    copy = state.mapper.class_manager.new_instance()
+    for attr in state.mapper.column_attrs:
+        value = state.dict.get(attr.key)
+        if attr.key in state.dict and not isinstance(value, sa.ClauseElement):
+            so.attributes.set_committed_value(copy, attr.key, value)
+    so.make_transient_to_detached(copy)
+    return copy
@@ -7,16 +7,48 @@ class Config:
     SECRET_KEY = os.getenv("SECRET_KEY", "secret")
 
     SQLALCHEMY_TRACH_MODIFICATIONS = False
+    SQLALCHEMY_REPLICAS = os.getenv("DATABASE_REPLICA_URLS", "").split()
+    SQLALCHEMY_ASYNC_DATABASE_URI = os.getenv("ASYNC_DATABASE_URL")
+    REPLICA_PIN_SECONDS = 10
+    REPLICA_PIN_CACHE_SIZE = 10000
+    SQL_INSTRUMENTATION = True
+    SLOW_QUERY_THRESHOLD = 0.5
 
     MAIL_SERVER = os.getenv("MAIL_SERVER", "localhost")
     MAIL_PORT = os.getenv("MAIL_PORT", 8025)
+    MAIL_WORKERS = 2
+    MAIL_QUEUE_SIZE = 1000
+    MAIL_QUEUE_TIMEOUT = 5
+    MAIL_BATCH_SIZE = 20
+    MAIL_IDLE_TIMEOUT = 30
 
     ADMIN_NAME = "frank"
     ADMIN_EMAIL = "frank@a.com"
 
+    API_TOKEN_CACHE_SIZE = 1024
+    API_TOKEN_CACHE_TTL = 60
+    API_STREAM_BATCH_SIZE = 500
+    API_BATCH_SIZE = 100
+    USER_CACHE_SIZE = 1024
+    USER_CACHE_TTL = 30
+    ROLE_CACHE_TTL = 30
+
+    LAST_SEEN_RESOLUTION = 60
+    LAST_SEEN_FLUSH_INTERVAL = 60
+
     POSTS_PER_PAGE = 10
     FOLLOWS_PER_PAGE = 10
     COMMENTS_PER_PAGE = 10
+    CURSOR_PAGINATION = False
+    FRAGMENT_CACHE_SIZE = 10000
+
+    TIMELINE_FANOUT_LIMIT = 10000
+    TIMELINE_BACKFILL = 100
+    TIMELINE_LENGTH = 1000
+    TIMELINE_TRIM_INTERVAL = 100
+
+    FOLLOW_GRAPH_TTL = 300
+    FOLLOW_SUGGESTIONS = 10
 
 
 class DevelopmentConfig(Config):
@@ -31,6 +63,13 @@ class TestingConfig(Config):
     WTF_CSRF_ENABLED = False
 
 
+class BenchmarkConfig(Config):
+    SQLALCHEMY_DATABASE_URI = os.getenv(
+        "BENCH_DATABASE_URL", "sqlite:///" + os.path.join(basedir, "db-bench.sqlite")
+    )
+    WTF_CSRF_ENABLED = False
+
+
 class ProductionConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.getenv(
         "DATABASE_URL", "sqlite:///" + os.path.join(basedir, "db.sqlite")
@@ -40,5 +79,6 @@ class ProductionConfig(Config):
 config = {
     "development": DevelopmentConfig,
     "testing": TestingConfig,
+    "benchmark": BenchmarkConfig,
     "production": ProductionConfig,
 }
@@ -1,6 +1,9 @@
+import hashlib
+from datetime import datetime, timezone
 from functools import wraps
+from time import time
 
-from flask import abort
+from flask import abort, current_app, make_response, request, session
 from flask_login import current_user
 
 from app.models import Permission
@@ -21,3 +24,82 @@ def permission_required(perm):
 
 def admin_required(f):
     return permission_required(Permission.ADMIN)(f)
+
+
+def use_primary(f):
+    """Keep a GET view that writes on the primary database."""
+    f.use_primary = True
+    return f
+
+
+def viewer_state():
+    """Return what a rendered page depends on besides its own rows.
+
+    That is the logged in user and the CSRF token embedded in forms, which is
+    only reused for one ``WTF_CSRF_TIME_LIMIT`` window.
+    """
+    state = [current_user.get_id(), getattr(current_user, "updated_at", None)]
+    time_limit = current_app.config.get("WTF_CSRF_TIME_LIMIT", 3600)
+    if current_app.config.get("WTF_CSRF_ENABLED", True):
+        state += [session.get("csrf_token"), time_limit and int(time() // time_limit)]
+    return state
+
+
+def conditional(validator, private=False):
+    """Answer conditional GETs from row versions before the view runs.
+
+    ``validator`` is called with the view arguments and returns the values
+    that change whenever the response does, usually ``updated_at`` columns or
+    their ``MAX`` over a collection, or ``None`` if there is no such resource
+    and the view should run (and 404). The ETag is a hash of those values and
+    the request URL, and the newest timestamp among them is sent as
+    Last-Modified, so a matching ``If-None-Match`` costs one small query and
+    no serialization or rendering. ``private`` pages also vary by viewer and
+    are only revalidated by ETag.
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def inner(*args, **kwargs):
+            if request.method not in ("GET", "HEAD") or session.get("_flashes"):
+                return f(*args, **kwargs)
+            versions = validator(*args, **kwargs)
+            if versions is None:
+                return f(*args, **kwargs)
+            key = [request.full_path, *versions]
+            if private:
+                key += viewer_state()
+            etag = hashlib.sha1(repr(key).encode()).hexdigest()
+            last_modified = max(
+                (
+                    value.replace(tzinfo=value.tzinfo or timezone.utc, microsecond=0)
+                    for value in versions
+                    if isinstance(value, datetime)
+                ),
+                default=None,
+            )
+            if request.if_none_match:
+                fresh = request.if_none_match.contains(etag)
+            else:
+                fresh = (
+                    not private
+                    and last_modified is not None
+                    and request.if_modified_since is not None
+                    and last_modified <= request.if_modified_since
+                )
+            if fresh:
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+            if response.status_code in (200, 304):
+                response.set_etag(etag)
+                response.last_modified = last_modified
+                response.cache_control.no_cache = True
+                if private:
+                    response.cache_control.private = True
+                    response.vary.add("Cookie")
+            return response
+
+        return inner
+
+    return decorator
@@ -1,16 +1,10 @@
-from threading import Thread
-
-from flask import current_app, render_template
+from flask import render_template
 from flask_mailman import EmailMessage
 
-
-def _send_async_mail(app, message):
-    with app.app_context():
-        message.send()
+from app.extensions import mail_queue
 
 
 def send_mail(subject, body, to, attachments=None, sync=False):
-    app = current_app._get_current_object()
     message = EmailMessage(subject, body, to=[to])
     message.content_subtype = "html"
     if attachments:
@@ -19,7 +13,7 @@ def send_mail(subject, body, to, attachments=None, sync=False):
     if sync:
         message.send()
     else:
-        Thread(target=_send_async_mail, args=(app, message)).start()
+        mail_queue.put(message)
 
 
 def send_confirmation_mail(user):
@@ -5,19 +5,36 @@ from flask_moment import Moment
 from flask_pagedown import PageDown
 from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
+from app.async_db import AsyncDatabase
+from app.cache import Cache
+from app.follow_graph import FollowGraph
+from app.instrumentation import SQLInstrumentation
+from app.last_seen import LastSeenBuffer
+from app.mail_queue import MailQueue
+from app.replicas import Replicas, RoutingSession
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 bootstrap = Bootstrap5()
 moment = Moment()
 mail = Mail()
 login = LoginManager()
 pagedown = PageDown()
+last_seen = LastSeenBuffer()
+mail_queue = MailQueue()
+replicas = Replicas()
+async_db = AsyncDatabase()
+sql_instrumentation = SQLInstrumentation()
+follow_graph = FollowGraph()
+token_cache = Cache("token_cache", "API_TOKEN_CACHE_SIZE", "API_TOKEN_CACHE_TTL")
+fragment_cache = Cache("fragment_cache", "FRAGMENT_CACHE_SIZE")
+user_cache = Cache("user_cache", "USER_CACHE_SIZE", "USER_CACHE_TTL")
 
 
 @login.user_loader
 def load_user(id):
     from app.models import User
 
-    return db.session.get(User, id)
+    return User.cached(int(id))
 
 
 from app.models import AnonymousUser  # noqa:E402
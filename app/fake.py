@@ -0,0 +1,157 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import sqlalchemy as sa
+from faker import Faker
+from werkzeug.security import generate_password_hash
+
+from app.extensions import db, follow_graph
+from app.models import Comment, Post, Role, User, follow
+from app.renderer import COMMENT_TAGS, POST_TAGS, render_many
+from app.search import rebuild as rebuild_search
+
+
+class FakeData:
+    """Generate a realistic dataset with bulk inserts.
+
+    Rows are inserted ``chunk_size`` at a time with ``executemany``, Markdown
+    is rendered in bulk (in parallel when ``executor`` is a process pool),
+    and the counters, timelines and search indexes are rebuilt once at the
+    end instead of through the per-row ORM events. Followers, post authors
+    and commented posts follow a power law whose head grows heavier with
+    ``skew``.
+    """
+
+    def __init__(self, chunk_size=5000, skew=2.0, executor=None):
+        self.chunk_size = chunk_size
+        self.skew = skew
+        self.executor = executor
+        self.faker = Faker()
+        self.sentences = self.faker.sentences(nb=2000)
+        self.now = datetime.now(timezone.utc)
+
+    def pick(self, n):
+        """Return an index in ``range(n)``, low indexes being the popular ones."""
+        return int(n * random.random() ** self.skew)
+
+    def text(self):
+        return " ".join(random.sample(self.sentences, random.randint(2, 6)))
+
+    def past(self, days=365):
+        return self.now - timedelta(seconds=random.randint(0, days * 24 * 3600))
+
+    def chunks(self, count):
+        for start in range(0, count, self.chunk_size):
+            yield range(start, min(start + self.chunk_size, count))
+
+    def users(self, count):
+        password_hash = generate_password_hash("123")
+        role_id = db.session.scalar(db.select(Role.id).filter_by(default=True))
+        offset = db.session.scalar(db.select(sa.func.max(User.id))) or 0
+        for chunk in self.chunks(count):
+            rows = []
+            for i in chunk:
+                username = f"{self.faker.user_name()}{offset + i}"
+                member_since = self.past(days=3 * 365)
+                rows.append(
+                    {
+                        "username": username,
+                        "email": f"{username}@{self.faker.free_email_domain()}",
+                        "password_hash": password_hash,
+                        "role_id": role_id,
+                        "confirmed": True,
+                        "name": self.faker.name(),
+                        "location": self.faker.city(),
+                        "about_me": self.text(),
+                        "member_since": member_since,
+                        "last_seen": member_since,
+                    }
+                )
+            db.session.execute(db.insert(User), rows)
+            db.session.commit()
+
+    def posts(self, count):
+        user_ids = db.session.scalars(db.select(User.id).order_by(User.id)).all()
+        for chunk in self.chunks(count):
+            bodies = [self.text() for _ in chunk]
+            html = render_many(bodies, POST_TAGS, self.executor)
+            db.session.execute(
+                db.insert(Post),
+                [
+                    {
+                        "body": body,
+                        "body_html": body_html,
+                        "timestamp": self.past(),
+                        "author_id": user_ids[self.pick(len(user_ids))],
+                    }
+                    for body, body_html in zip(bodies, html)
+                ],
+            )
+            db.session.commit()
+
+    def follows(self, average):
+        user_ids = db.session.scalars(db.select(User.id).order_by(User.id)).all()
+        n = len(user_ids)
+        if n < 2 or average <= 0:
+            return
+        rows = []
+        for follower in user_ids:
+            wanted = min(n // 2, int(random.expovariate(1 / average)))
+            followed = set()
+            for _ in range(wanted * 10):
+                if len(followed) >= wanted:
+                    break
+                user_id = user_ids[self.pick(n)]
+                if user_id != follower:
+                    followed.add(user_id)
+            # follow.followed_id holds the follower, following_id the followee.
+            rows.extend(
+                {"followed_id": follower, "following_id": user_id}
+                for user_id in followed
+            )
+            if len(rows) >= self.chunk_size:
+                self._insert_follows(rows)
+                rows = []
+        self._insert_follows(rows)
+        follow_graph.invalidate()
+
+    def _insert_follows(self, rows):
+        if rows:
+            db.session.execute(
+                follow.insert().prefix_with("OR IGNORE", dialect="sqlite"), rows
+            )
+            db.session.commit()
+
+    def comments(self, count):
+        user_ids = db.session.scalars(db.select(User.id).order_by(User.id)).all()
+        posts = db.session.execute(
+            db.select(Post.id, Post.timestamp).order_by(Post.id)
+        ).all()
+        if not posts:
+            return
+        for chunk in self.chunks(count):
+            bodies = [self.faker.sentence() for _ in chunk]
+            html = render_many(bodies, COMMENT_TAGS, self.executor)
+            rows = []
+            for body, body_html in zip(bodies, html):
+                post = posts[self.pick(len(posts))]
+                timestamp = post.timestamp.replace(tzinfo=timezone.utc)
+                rows.append(
+                    {
+                        "body": body,
+                        "body_html": body_html,
+                        "timestamp": timestamp
+                        + (self.now - timestamp) * random.random(),
+                        "author_id": random.choice(user_ids),
+                        "post_id": post.id,
+                        "disabled": False,
+                    }
+                )
+            db.session.execute(db.insert(Comment), rows)
+            db.session.commit()
+
+    def rebuild(self):
+        User.recount(self.chunk_size)
+        Post.recount(self.chunk_size)
+        User.rebuild_timelines(self.chunk_size)
+        rebuild_search(self.chunk_size)
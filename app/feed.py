@@ -0,0 +1,44 @@
+import sqlalchemy.orm as so
+from flask import current_app, request
+
+from app.extensions import db
+from app.models import Comment, Post
+from app.pagination import CursorPagination
+
+
+def load_posts(query):
+    return query.options(so.selectinload(Post.author))
+
+
+def load_comments(query):
+    return query.options(so.selectinload(Comment.author))
+
+
+def paginate(query, columns, per_page, keys=None):
+    """Paginate by page number, or by cursor when the request carries one.
+
+    Setting ``CURSOR_PAGINATION`` makes the cursor mode the default.
+    """
+    cursor = request.args.get("cursor")
+    if cursor is None and not current_app.config["CURSOR_PAGINATION"]:
+        return db.paginate(query, per_page=per_page)
+    return CursorPagination(query, columns, cursor, per_page, keys=keys)
+
+
+def paginate_posts(query, per_page, columns=None):
+    """Paginate posts with their authors loaded in one extra query.
+
+    Comment counts are plain columns on ``Post``, so rendering a page costs
+    the count, the page and the authors whatever the page size. ``columns``
+    are those the query is ordered by when they aren't the ``Post`` ones,
+    such as the timeline columns of a ``Timeline``.
+    """
+    keys = [column.key for column in Post.cursor_columns()]
+    return paginate(
+        load_posts(query), columns or Post.cursor_columns(), per_page, keys=keys
+    )
+
+
+def paginate_comments(query, per_page):
+    """Paginate comments with their authors loaded in one extra query."""
+    return paginate(load_comments(query), Comment.cursor_columns(), per_page)
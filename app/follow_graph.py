@@ -0,0 +1,226 @@
+import heapq
+import logging
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from itertools import islice
+from threading import Lock, Thread
+from time import monotonic
+
+import sqlalchemy as sa
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+class _Graph:
+    def __init__(self):
+        # User id -> ids it follows, and user id -> ids following it.
+        self.following = {}
+        self.followers = {}
+        # One packed (follower, followee) key per edge, for membership tests.
+        self.edges = set()
+        # (-follower count, id) of every followed user, most followed first,
+        # or None until the graph is loaded and ranked once.
+        self.popular = None
+        self.loaded = monotonic()
+
+    def rank(self):
+        self.popular = sorted(
+            (-len(ids), id) for id, ids in self.followers.items() if ids
+        )
+
+    def rerank(self, id, old_count, new_count):
+        if self.popular is None:
+            return
+        if old_count:
+            del self.popular[bisect_left(self.popular, (-old_count, id))]
+        if new_count:
+            insort(self.popular, (-new_count, id))
+
+    def add(self, follower_id, followee_id):
+        key = follower_id << 32 | followee_id
+        if key not in self.edges:
+            self.edges.add(key)
+            self.following.setdefault(follower_id, array("q")).append(followee_id)
+            followers = self.followers.setdefault(followee_id, array("q"))
+            followers.append(follower_id)
+            self.rerank(followee_id, len(followers) - 1, len(followers))
+
+    def remove(self, follower_id, followee_id):
+        key = follower_id << 32 | followee_id
+        if key in self.edges:
+            self.edges.discard(key)
+            self.following[follower_id].remove(followee_id)
+            followers = self.followers[followee_id]
+            followers.remove(follower_id)
+            self.rerank(followee_id, len(followers) + 1, len(followers))
+
+    def apply(self, changes):
+        for (follower_id, followee_id), following in changes.items():
+            if following:
+                self.add(follower_id, followee_id)
+            else:
+                self.remove(follower_id, followee_id)
+
+
+class _State:
+    def __init__(self):
+        self.lock = Lock()
+        self.graph = None
+        # The changes applied while a reload runs, or None when none runs.
+        self.reloading = None
+        self.reloader = None
+
+
+class FollowGraph:
+    """Keep the ``follow`` table in memory as adjacency arrays.
+
+    The graph answers ``User.is_following_cached`` with a set lookup and
+    ranks "who to follow" suggestions without a query. Each process loads it
+    when the app is created, or on first use if the tables don't exist yet.
+    Every ``FOLLOW_GRAPH_TTL`` seconds a background thread loads a new graph
+    to pick up the writes of other processes, while requests keep using the
+    old one, so the graph only serves display; writes check the ``follow``
+    table. Its own follows and unfollows are applied when their session
+    commits.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        state = app.extensions["follow_graph"] = _State()
+        with app.app_context():
+            try:
+                state.graph = self.load()
+            except sa.exc.SQLAlchemyError:
+                # Before ``flask deploy`` there is no follow table to load.
+                logger.debug("Follow graph not loaded", exc_info=True)
+
+    @property
+    def graph(self):
+        state = current_app.extensions["follow_graph"]
+        graph = state.graph
+        if graph is None:
+            with state.lock:
+                if state.graph is None:
+                    state.graph = self.load()
+                return state.graph
+        if monotonic() - graph.loaded >= current_app.config["FOLLOW_GRAPH_TTL"]:
+            self.reload(state)
+        return graph
+
+    def reload(self, state):
+        """Load a new graph in a background thread unless one is loading."""
+        with state.lock:
+            if state.reloading is not None:
+                return
+            state.reloading = []
+            state.reloader = Thread(
+                target=self._reload,
+                args=(current_app._get_current_object(), state, state.graph),
+                daemon=True,
+            )
+            state.reloader.start()
+
+    def _reload(self, app, state, old):
+        graph = None
+        try:
+            with app.app_context():
+                graph = self.load()
+        except Exception:
+            logger.exception("Failed to reload the follow graph")
+        with state.lock:
+            changes, state.reloading = state.reloading, None
+            if state.graph is not old:
+                # Invalidated meanwhile, the new graph may miss that write.
+                return
+            if graph is None:
+                old.loaded = monotonic()
+                return
+            # Commits applied to the old graph during the load may be missing
+            # from the new one.
+            for change in changes:
+                graph.apply(change)
+            state.graph = graph
+
+    def load(self):
+        from app.extensions import db
+        from app.models import follow
+
+        graph = _Graph()
+        # follow.followed_id holds the follower, following_id the followee.
+        rows = db.session.execute(
+            db.select(follow.c.followed_id, follow.c.following_id).execution_options(
+                yield_per=10000
+            )
+        )
+        for follower_id, followee_id in rows:
+            graph.add(follower_id, followee_id)
+        graph.rank()
+        return graph
+
+    def invalidate(self):
+        """Drop the graph, for writes to ``follow`` that bypass the ORM."""
+        current_app.extensions["follow_graph"].graph = None
+
+    def is_following(self, follower_id, followee_id):
+        return follower_id << 32 | followee_id in self.graph.edges
+
+    def apply(self, changes):
+        """Apply ``{(follower_id, followee_id): following}`` to a loaded graph.
+
+        A ``None`` key stands for changes between users that had no id yet,
+        which drop the graph instead.
+        """
+        if None in changes:
+            return self.invalidate()
+        state = current_app.extensions["follow_graph"]
+        with state.lock:
+            if state.graph is None:
+                return
+            state.graph.apply(changes)
+            if state.reloading is not None:
+                state.reloading.append(changes)
+
+    def on_commit(self, session):
+        changes = session.info.pop("follows", None)
+        if changes:
+            self.apply(changes)
+
+    def on_transaction_end(self, session, transaction):
+        if transaction.parent is None and session.info.pop("follows", None):
+            # The graph may have been loaded after the changes were flushed.
+            self.invalidate()
+
+    def suggestions(self, user_id, count):
+        """Return the ids of up to ``count`` users for ``user_id`` to follow.
+
+        Users followed by more of the people ``user_id`` follows come first,
+        then the most followed users, skipping those already followed.
+        """
+        graph = self.graph
+        with current_app.extensions["follow_graph"].lock:
+            following = graph.following.get(user_id, ())
+            excluded = {user_id, *following}
+            mutual = Counter(
+                candidate
+                for followee_id in following
+                for candidate in graph.following.get(followee_id, ())
+                if candidate not in excluded
+            )
+            popularity = {id: len(graph.followers.get(id, ())) for id in mutual}
+            # Enough of the most followed users to fill the list even when
+            # all the excluded ones are among them.
+            popular = graph.popular[: count + len(excluded)]
+        ranked = heapq.nlargest(
+            count, mutual, key=lambda id: (mutual[id], popularity[id], -id)
+        )
+        if len(ranked) < count:
+            excluded.update(ranked)
+            ranked += islice(
+                (id for _, id in popular if id not in excluded), count - len(ranked)
+            )
+        return ranked
@@ -0,0 +1,60 @@
+from flask import render_template
+from markupsafe import Markup, escape
+
+from app.extensions import fragment_cache
+
+
+def slot(name):
+    return Markup(f"<!--slot:{name}-->")
+
+
+def render_fragment(template, key, version, slots, **context):
+    """Render ``template``, reusing the markup cached under ``key``.
+
+    The cached markup is reused while ``version`` is unchanged. Names in
+    ``slots`` are rendered as placeholders, so the fragment doesn't depend
+    on the viewer, and are filled with their live values on every call.
+    """
+    cached = fragment_cache.get(key)
+    if cached is not None and cached[0] == version:
+        html = cached[1]
+    else:
+        html = render_template(
+            template, **context, **{name: slot(name) for name in slots}
+        )
+        fragment_cache.set(key, (version, html))
+    for name, value in slots.items():
+        html = html.replace(slot(name), escape(value))
+    return Markup(html)
+
+
+def post_fragment(post, **slots):
+    return render_fragment(
+        "post/_post.html",
+        ("post", post.id),
+        (post.updated_at, post.author.updated_at),
+        slots,
+        post=post,
+    )
+
+
+def comment_fragment(comment, moderate=False, **slots):
+    moderate = bool(moderate)
+    slots.setdefault("footer", "")
+    return render_fragment(
+        "post/_comment.html",
+        ("comment", comment.id, moderate),
+        (comment.updated_at, comment.author.updated_at),
+        slots,
+        comment=comment,
+        moderate=moderate,
+    )
+
+
+def invalidate_post(id):
+    fragment_cache.pop(("post", id))
+
+
+def invalidate_comment(id):
+    for moderate in (False, True):
+        fragment_cache.pop(("comment", id, moderate))
@@ -0,0 +1,83 @@
+import logging
+from time import perf_counter
+
+import sqlalchemy as sa
+from flask import current_app, g, has_request_context, request, request_started
+
+logger = logging.getLogger(__name__)
+
+
+class _Stats:
+    __slots__ = ("queries", "duration")
+
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0.0
+
+
+class SQLInstrumentation:
+    """Time the SQL statements of each request.
+
+    The statement count and total database time of a request are sent in a
+    ``Server-Timing`` header, and statements slower than
+    ``SLOW_QUERY_THRESHOLD`` seconds are logged with the endpoint that ran
+    them. The engine hooks only read the clock and add two numbers, so this
+    can stay on in production; set ``SQL_INSTRUMENTATION`` to turn it off.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config["SQL_INSTRUMENTATION"]:
+            return
+        from app.extensions import db
+
+        with app.app_context():
+            engines = [*db.engines.values(), *app.extensions.get("replicas", [])]
+        if app.extensions.get("async_db") is not None:
+            engines.append(app.extensions["async_db"].sync_engine)
+        for engine in engines:
+            sa.event.listen(engine, "before_cursor_execute", self._before_execute)
+            sa.event.listen(engine, "after_cursor_execute", self._after_execute)
+        # The signal is sent before any before_request function, so the
+        # queries of those registered by blueprints are counted too.
+        request_started.connect(self._start, app)
+        app.after_request(self._finish)
+
+    @staticmethod
+    def stats():
+        """Return the statistics of the current request, or ``None``."""
+        return g.get("sql_stats") if has_request_context() else None
+
+    def _start(self, sender, **extra):
+        g.sql_stats = _Stats()
+
+    def _finish(self, response):
+        stats = g.pop("sql_stats", None)
+        if stats is not None:
+            response.headers.add(
+                "Server-Timing",
+                f'db;dur={stats.duration * 1000:.1f};desc="{stats.queries} queries"',
+            )
+        return response
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, many):
+        context._query_start = perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, many):
+        duration = perf_counter() - context._query_start
+        stats = self.stats()
+        if stats is None:
+            return
+        stats.queries += 1
+        stats.duration += duration
+        threshold = current_app.config["SLOW_QUERY_THRESHOLD"]
+        if threshold is not None and duration >= threshold:
+            logger.warning(
+                "Slow query (%.1f ms) in %s: %s",
+                duration * 1000,
+                request.endpoint,
+                statement,
+            )
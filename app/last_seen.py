@@ -0,0 +1,109 @@
+import atexit
+import logging
+import weakref
+from datetime import datetime, timedelta, timezone
+from threading import Event, Lock, Thread
+from time import monotonic
+
+import sqlalchemy as sa
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+class _Pending:
+    def __init__(self):
+        self.lock = Lock()
+        self.seen = {}
+        self.flushed = monotonic()
+
+
+class LastSeenBuffer:
+    """Collect ``User.last_seen`` updates in memory and write them in bulk.
+
+    A user is only recorded once per ``LAST_SEEN_RESOLUTION`` seconds, and
+    the collected timestamps are written every ``LAST_SEEN_FLUSH_INTERVAL``
+    seconds with a single ``UPDATE ... CASE`` statement by a background
+    thread, so requests never open a write transaction. One thread and one
+    exit handler serve every app of the process, and hold the apps weakly
+    so discarded ones can be freed.
+    """
+
+    def __init__(self, app=None):
+        self._apps = weakref.WeakSet()
+        self._flusher = None
+        self._lock = Lock()
+        self._stopped = Event()
+        atexit.register(self._flush_at_exit)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions["last_seen"] = _Pending()
+        self._apps.add(app)
+
+    @property
+    def pending(self):
+        return current_app.extensions["last_seen"]
+
+    def touch(self, user):
+        now = datetime.now(timezone.utc)
+        resolution = timedelta(seconds=current_app.config["LAST_SEEN_RESOLUTION"])
+        pending = self.pending
+        with pending.lock:
+            last_seen = pending.seen.get(user.id, user.last_seen)
+            if (
+                last_seen is None
+                or now - last_seen.replace(tzinfo=timezone.utc) >= resolution
+            ):
+                pending.seen[user.id] = now
+        self._start_flusher()
+
+    def flush(self):
+        from app.extensions import db
+        from app.models import User
+
+        pending = self.pending
+        with pending.lock:
+            seen, pending.seen = pending.seen, {}
+            pending.flushed = monotonic()
+        if not seen:
+            return
+        # Leave updated_at alone: pages that only show the user as an author
+        # shouldn't be invalidated every time they are seen.
+        with db.engine.begin() as connection:
+            connection.execute(
+                sa.update(User)
+                .where(User.id.in_(seen))
+                .values(
+                    last_seen=sa.case(seen, value=User.id),
+                    updated_at=User.updated_at,
+                )
+            )
+
+    def _start_flusher(self):
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = Thread(target=self._flush_periodically, daemon=True)
+                self._flusher.start()
+
+    def _flush_periodically(self):
+        while not self._stopped.wait(1):
+            self._flush_apps(due_only=True)
+
+    def _flush_apps(self, due_only=False):
+        for app in list(self._apps):
+            with app.app_context():
+                interval = current_app.config["LAST_SEEN_FLUSH_INTERVAL"]
+                if due_only and monotonic() - self.pending.flushed < interval:
+                    continue
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception("Failed to write last_seen updates")
+
+    def _flush_at_exit(self):
+        self._stopped.set()
+        self._flush_apps()
@@ -0,0 +1,157 @@
+import atexit
+import logging
+import weakref
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+from time import monotonic
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+class _State:
+    def __init__(self, app):
+        # Workers reach the app through here, so they must not keep it alive.
+        self.app = weakref.ref(app)
+        self.queue = Queue(maxsize=app.config["MAIL_QUEUE_SIZE"])
+        self.lock = Lock()
+        self.workers = []
+        self.stats = {"queued": 0, "sent": 0, "failed": 0, "rejected": 0}
+
+
+class MailQueue:
+    """Send mail from a bounded queue drained by a fixed pool of threads.
+
+    Each worker keeps its SMTP connection open while there is work and sends
+    up to ``MAIL_BATCH_SIZE`` queued messages per round, closing it after
+    ``MAIL_IDLE_TIMEOUT`` seconds without mail. When the queue is full,
+    ``put`` blocks for ``MAIL_QUEUE_TIMEOUT`` seconds before rejecting the
+    message, so a burst slows producers down instead of piling up threads.
+    Mail still queued at exit is drained by one handler for every app. The
+    handler and the workers hold the apps weakly, and the workers of a
+    discarded app stop once they are idle.
+    """
+
+    def __init__(self, app=None):
+        self._apps = weakref.WeakSet()
+        atexit.register(self._drain)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions["mail_queue"] = _State(app)
+        self._apps.add(app)
+
+    @property
+    def state(self):
+        return current_app.extensions["mail_queue"]
+
+    def put(self, message):
+        state = self.state
+        self._start_workers(state)
+        try:
+            state.queue.put(message, timeout=current_app.config["MAIL_QUEUE_TIMEOUT"])
+        except Full:
+            self._count(state, "rejected")
+            logger.warning("Mail queue is full, dropped message to %s", message.to)
+            return False
+        self._count(state, "queued")
+        return True
+
+    def metrics(self):
+        state = self.state
+        with state.lock:
+            return dict(
+                state.stats,
+                depth=state.queue.qsize(),
+                capacity=state.queue.maxsize,
+                workers=len(state.workers),
+            )
+
+    def join(self, timeout=None):
+        """Wait until every queued message was handled, or ``timeout`` passes."""
+        state = self.state
+        deadline = None if timeout is None else monotonic() + timeout
+        while state.queue.unfinished_tasks:
+            if deadline is not None and monotonic() >= deadline:
+                return False
+            with state.queue.all_tasks_done:
+                state.queue.all_tasks_done.wait(0.1)
+        return True
+
+    def _count(self, state, key, n=1):
+        with state.lock:
+            state.stats[key] += n
+
+    def _start_workers(self, state):
+        if state.workers:
+            return
+        config = current_app.config
+        with state.lock:
+            while len(state.workers) < config["MAIL_WORKERS"]:
+                worker = Thread(
+                    target=self._work,
+                    args=(
+                        state,
+                        config["MAIL_BATCH_SIZE"],
+                        config["MAIL_IDLE_TIMEOUT"],
+                    ),
+                    daemon=True,
+                )
+                worker.start()
+                state.workers.append(worker)
+
+    def _work(self, state, batch_size, idle_timeout):
+        connection = None
+        while True:
+            try:
+                batch = [state.queue.get(timeout=idle_timeout)]
+            except Empty:
+                if connection is not None:
+                    connection.close()
+                    connection = None
+                if state.app() is None:
+                    return
+                continue
+            while len(batch) < batch_size:
+                try:
+                    batch.append(state.queue.get_nowait())
+                except Empty:
+                    break
+            try:
+                connection = self._send(state, batch, connection)
+            finally:
+                for _ in batch:
+                    state.queue.task_done()
+
+    def _send(self, state, batch, connection):
+        """Send ``batch`` and return the connection to reuse, if any."""
+        from app.extensions import mail
+
+        try:
+            app = state.app()
+            if app is None:
+                raise RuntimeError("The app of the mail queue was discarded")
+            with app.app_context():
+                if connection is None:
+                    connection = mail.get_connection()
+                    connection.open()
+                sent = connection.send_messages(batch)
+            self._count(state, "sent", sent)
+            self._count(state, "failed", len(batch) - sent)
+            return connection
+        except Exception:
+            logger.exception("Failed to send %d messages", len(batch))
+            self._count(state, "failed", len(batch))
+            if connection is not None:
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+
+    def _drain(self):
+        for app in list(self._apps):
+            with app.app_context():
+                if self.state.workers:
+                    self.join(timeout=current_app.config["MAIL_QUEUE_TIMEOUT"])
@@ -1,33 +1,276 @@
-from datetime import datetime, timezone
+import secrets
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
 from hashlib import md5
-from time import time
+from operator import attrgetter
+from time import monotonic, time
+from types import MappingProxyType
 from typing import Optional
 
-import bleach
 import jwt
 import sqlalchemy as sa
 import sqlalchemy.orm as so
-from flask import current_app, url_for
+from flask import current_app, has_request_context, request, url_for
 from flask_login import AnonymousUserMixin, UserMixin
-from markdown import markdown
 from werkzeug.security import check_password_hash, generate_password_hash
 
 from app.api.error import ValidationError
-from app.extensions import db
+from app.cache import snapshot
+from app.extensions import db, follow_graph, replicas, token_cache, user_cache
+from app.fragments import invalidate_comment, invalidate_post
+from app.pagination import CursorPagination, RowPagination
+from app.renderer import COMMENT_TAGS, POST_TAGS, render
+from app.search import searchable
 
 follow = db.Table(
     "follow",
     sa.Column("following_id", sa.ForeignKey("user.id"), primary_key=True),
     sa.Column("followed_id", sa.ForeignKey("user.id"), primary_key=True),
+    sa.Index("ix_follow_followed_id_following_id", "followed_id", "following_id"),
 )
 
+timeline = db.Table(
+    "timeline",
+    sa.Column("user_id", sa.ForeignKey("user.id"), primary_key=True),
+    sa.Column("post_id", sa.ForeignKey("post.id"), primary_key=True),
+    sa.Column("timestamp", sa.DateTime, nullable=False),
+    sa.Index(
+        "ix_timeline_user_id_timestamp_post_id", "user_id", "timestamp", "post_id"
+    ),
+)
+
+# The posts of a home timeline, ordered newest first by ``columns``.
+Timeline = namedtuple("Timeline", ["query", "columns"])
+
+
+def adjust_counter(target, name, delta):
+    """Add ``delta`` to a denormalized counter column of ``target``.
+
+    Rows that already exist are updated with a SQL expression so concurrent
+    writers don't lose increments, pending rows just start from zero.
+    """
+    state = sa.inspect(target)
+    value = state.dict.get(name)
+    if isinstance(value, sa.ColumnElement):
+        value = value + delta
+    elif state.has_identity:
+        value = getattr(type(target), name) + delta
+    else:
+        value = (value or 0) + delta
+    setattr(target, name, value)
+
+
+URL_TEMPLATE_ID = 9876543210
+
+
+def url_template(endpoint):
+    """Return the URL of ``endpoint`` as a format string taking the ``id``.
+
+    Each template is built once with ``url_for``, so formatting it gives the
+    same URL without going through the router for every item.
+    """
+    key = (endpoint, request.script_root if has_request_context() else None)
+    templates = current_app.extensions.setdefault("url_templates", {})
+    template = templates.get(key)
+    if template is None:
+        template = url_for(endpoint, id=URL_TEMPLATE_ID).replace(
+            str(URL_TEMPLATE_ID), "{}"
+        )
+        templates[key] = template
+    return template
+
+
+def session_of(instance):
+    """Return the session ``instance`` belongs to, or ``db.session``."""
+    return so.object_session(instance) or db.session
+
+
+def trim_timelines(connection, user_ids):
+    """Keep the newest ``TIMELINE_LENGTH`` entries of the timelines of ``user_ids``.
+
+    ``user_ids`` is a select of one column. The oldest entry to keep is found
+    with one walk of the timeline index per user, and entries as old as it
+    are kept, so timestamp ties can leave a timeline a few entries longer.
+    """
+    users = user_ids.subquery()
+    cutoff = (
+        db.select(timeline.c.timestamp)
+        .where(timeline.c.user_id == users.c[0])
+        .order_by(timeline.c.timestamp.desc(), timeline.c.post_id.desc())
+        .offset(current_app.config["TIMELINE_LENGTH"] - 1)
+        .limit(1)
+        .scalar_subquery()
+    )
+    cutoffs = [
+        {"user": user_id, "cutoff": timestamp}
+        for user_id, timestamp in connection.execute(
+            db.select(users.c[0], cutoff.label("cutoff"))
+        )
+        if timestamp is not None
+    ]
+    if cutoffs:
+        connection.execute(
+            timeline.delete().where(
+                timeline.c.user_id == sa.bindparam("user"),
+                timeline.c.timestamp < sa.bindparam("cutoff"),
+            ),
+            cutoffs,
+        )
+
+
+def record_follow(follower, followee, following):
+    """Note a follow change for the follow graph to apply on commit."""
+    changes = session_of(follower).info.setdefault("follows", {})
+    if follower.id is None or followee.id is None:
+        changes[None] = following
+    else:
+        changes[(follower.id, followee.id)] = following
+
+
+def count_by(column, start, stop):
+    """Count rows per value of ``column`` for values in ``(start, stop]``."""
+    return dict(
+        db.session.execute(
+            db.select(column, sa.func.count())
+            .where(column > start, column <= stop)
+            .group_by(column)
+        ).all()
+    )
+
 
 class PaginatedAPIMixin:
+    # The JSON of an item has the fields of ``json_fields``, read as attributes
+    # of the same name, and the ``_links`` built by ``json_links``. Collections
+    # select only the columns of the requested fields and serialize the rows,
+    # and single instances go through the same serializer, so both give the
+    # same JSON without loading instances for collections. Relations listed in
+    # ``json_embeds`` can be added under ``_embedded``, loaded for all the items
+    # at once with one query per relation.
+
+    @classmethod
+    def cursor_columns(cls):
+        return (cls.timestamp, cls.id)
+
+    @classmethod
+    def json_columns(cls, fields=None, embed=()):
+        columns = {column.key: column for column in (cls.id, *cls.cursor_columns())}
+        for name, field_columns in cls.json_fields().items():
+            if fields is None or name in fields:
+                columns.update((column.key, column) for column in field_columns)
+        for name in embed:
+            embed_columns, _ = cls.json_embeds()[name]
+            columns.update((column.key, column) for column in embed_columns)
+        return list(columns.values())
+
     @staticmethod
-    def to_json_collection(query, page, per_page, endpoint, **kwargs):
-        resources = db.paginate(query, page=page, per_page=per_page, error_out=False)
+    def json_embeds():
+        """Return ``{name: (columns, load)}`` for the relations to embed.
+
+        ``load(items, session)`` returns the JSON of the relation of each of
+        ``items``, reading ``columns`` from them.
+        """
+        return {}
+
+    @classmethod
+    def json_serializer(cls, fields=None):
+        """Return a function building the JSON of an instance or a row.
+
+        Fields not in ``fields`` are left out and never computed.
+        """
+        getters = [
+            (name, cls.json_links() if name == "_links" else attrgetter(name))
+            for name in cls.json_fields()
+            if fields is None or name in fields
+        ]
+
+        def to_json(item):
+            return {name: get(item) for name, get in getters}
+
+        return to_json
+
+    @classmethod
+    def json_query(cls, query, fields=None, embed=()):
+        return query.with_only_columns(*cls.json_columns(fields, embed))
+
+    @classmethod
+    def json_args(cls, fields=None, embed=()):
+        """Return ``fields`` and ``embed`` as query arguments for links."""
+        args = {}
+        if fields is not None:
+            args["fields"] = ",".join(
+                name for name in cls.json_fields() if name in fields
+            )
+        if embed:
+            args["embed"] = ",".join(
+                name for name in cls.json_embeds() if name in embed
+            )
+        return args
+
+    @classmethod
+    def serialize(cls, items, fields=None, embed=(), session=None):
+        """Return the JSON of ``items``, instances or rows of ``json_query``."""
+        serialize = cls.json_serializer(fields)
+        results = [serialize(item) for item in items]
+        if embed and items:
+            session = db.session if session is None else session
+            for name, (_, load) in cls.json_embeds().items():
+                if name in embed:
+                    for result, value in zip(results, load(items, session)):
+                        result.setdefault("_embedded", {})[name] = value
+        return results
+
+    @classmethod
+    def iter_json(cls, query, session=None, fields=None):
+        """Yield the JSON of every item of ``query``."""
+        session = db.session if session is None else session
+        serialize = cls.json_serializer(fields)
+        for row in session.execute(cls.json_query(query, fields)):
+            yield serialize(row)
+
+    def to_json(self, fields=None, embed=()):
+        if embed:
+            return self.serialize([self], fields, embed, session_of(self))[0]
+        return self.json_serializer(fields)(self)
+
+    @classmethod
+    def to_json_collection(
+        cls,
+        query,
+        page,
+        per_page,
+        endpoint,
+        cursor=None,
+        session=None,
+        fields=None,
+        embed=(),
+        columns=None,
+        **kwargs,
+    ):
+        if cursor is not None:
+            return cls.to_json_cursor_collection(
+                query,
+                cursor,
+                per_page,
+                endpoint,
+                session=session,
+                fields=fields,
+                embed=embed,
+                columns=columns,
+                **kwargs,
+            )
+        session = db.session if session is None else session
+        resources = RowPagination(
+            select=cls.json_query(query, fields, embed),
+            session=session,
+            page=page,
+            per_page=per_page,
+            max_per_page=None,
+            error_out=False,
+            count=True,
+        )
+        kwargs.update(cls.json_args(fields, embed))
         return {
-            "items": [item.to_dict() for item in resources.items],
+            "items": cls.serialize(resources.items, fields, embed, session),
             "_meta": {
                 "page": page,
                 "per_page": per_page,
@@ -45,6 +288,112 @@ class PaginatedAPIMixin:
             },
         }
 
+    @classmethod
+    def to_json_batch(cls, ids, fields=None):
+        """Return the items with the given ``ids`` in that order, in one query.
+
+        Ids without an item are listed under ``missing``.
+        """
+        serialize = cls.json_serializer(fields)
+        found = {
+            row.id: row
+            for row in db.session.execute(
+                cls.json_query(db.select(cls).where(cls.id.in_(ids)), fields)
+            )
+        }
+        return {
+            "items": [serialize(found[id]) for id in ids if id in found],
+            "missing": [id for id in ids if id not in found],
+        }
+
+    @classmethod
+    def to_json_cursor_collection(
+        cls,
+        query,
+        cursor,
+        per_page,
+        endpoint,
+        session=None,
+        fields=None,
+        embed=(),
+        columns=None,
+        **kwargs,
+    ):
+        # ``columns`` are those ``query`` is ordered by, when they aren't the
+        # cursor columns of the model but hold the same values.
+        session = db.session if session is None else session
+        resources = CursorPagination(
+            cls.json_query(query, fields, embed),
+            columns or cls.cursor_columns(),
+            cursor,
+            per_page,
+            session=session,
+            rows=True,
+            keys=[column.key for column in cls.cursor_columns()],
+        )
+        kwargs.update(cls.json_args(fields, embed))
+        return {
+            "items": cls.serialize(resources.items, fields, embed, session),
+            "_meta": {
+                "cursor": resources.cursor,
+                "per_page": per_page,
+            },
+            "_links": {
+                "self": url_for(endpoint, cursor=cursor, per_page=per_page, **kwargs),
+                "next": url_for(
+                    endpoint,
+                    cursor=resources.next_cursor,
+                    per_page=per_page,
+                    **kwargs,
+                )
+                if resources.has_next
+                else None,
+                "prev": url_for(
+                    endpoint,
+                    cursor=resources.prev_cursor,
+                    per_page=per_page,
+                    **kwargs,
+                )
+                if resources.has_prev
+                else None,
+            },
+        }
+
+
+def embed_authors(items, session):
+    """Return the JSON of the author of each item, from one query."""
+    serialize = User.json_serializer()
+    query = db.select(User).where(User.id.in_({item.author_id for item in items}))
+    authors = {
+        row.id: serialize(row) for row in session.execute(User.json_query(query))
+    }
+    return [authors.get(item.author_id) for item in items]
+
+
+def embed_comments(items, session):
+    """Return the newest page of comments of each post, from one query."""
+    query = Comment.json_query(
+        db.select(Comment).where(Comment.post_id.in_({item.id for item in items}))
+    ).add_columns(
+        sa.func.row_number()
+        .over(
+            partition_by=Comment.post_id,
+            order_by=(Comment.timestamp.desc(), Comment.id.desc()),
+        )
+        .label("rank")
+    )
+    ranked = query.subquery()
+    rows = session.execute(
+        db.select(ranked)
+        .where(ranked.c.rank <= current_app.config["COMMENTS_PER_PAGE"])
+        .order_by(ranked.c.post_id, ranked.c.rank)
+    )
+    serialize = Comment.json_serializer()
+    comments = {item.id: [] for item in items}
+    for row in rows:
+        comments[row.post_id].append(serialize(row))
+    return [comments[item.id] for item in items]
+
 
 class User(UserMixin, PaginatedAPIMixin, db.Model):
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
@@ -59,10 +408,17 @@ class User(UserMixin, PaginatedAPIMixin, db.Model):
     last_seen: so.Mapped[datetime] = so.mapped_column(
         default=lambda: datetime.now(timezone.utc)
     )
+    updated_at: so.Mapped[datetime] = so.mapped_column(
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+    )
     role_id: so.Mapped[Optional[int]] = so.mapped_column(sa.ForeignKey("role.id"))
     role: so.Mapped["Role"] = so.relationship(back_populates="users")
     password_hash: so.Mapped[str] = so.mapped_column(sa.String(128))
     confirmed: so.Mapped[bool] = so.mapped_column(default=False)
+    posts_count: so.Mapped[int] = so.mapped_column(default=0)
+    following_count: so.Mapped[int] = so.mapped_column(default=0)
+    followed_count: so.Mapped[int] = so.mapped_column(default=0)
     posts: so.WriteOnlyMapped["Post"] = so.relationship(back_populates="author")
     following: so.WriteOnlyMapped["User"] = so.relationship(
         secondary=follow,
@@ -82,13 +438,18 @@ class User(UserMixin, PaginatedAPIMixin, db.Model):
     )
     token_expiration: so.Mapped[Optional[datetime]]
 
+    @classmethod
+    def cursor_columns(cls):
+        return (cls.id,)
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        if self.role is None:
+        if self.role is None and self.role_id is None:
+            roles = Role.cached()
             if self.email == current_app.config["ADMIN_EMAIL"]:
-                self.role = db.session.scalar(db.select(Role).filter_by(name="Admin"))
+                self.role_id = roles.ids.get("Admin")
             else:
-                self.role = db.session.scalar(db.select(Role).filter_by(default=True))
+                self.role_id = roles.default
 
     @property
     def password(self):
@@ -125,93 +486,349 @@ class User(UserMixin, PaginatedAPIMixin, db.Model):
             return True
 
     def can(self, perm):
-        return self.role is not None and self.role.has_permission(perm)
+        role_id = self.role_id
+        if role_id is None and self.role is not None:
+            role_id = self.role.id
+        return Role.cached().permissions.get(role_id, 0) & perm == perm
 
     def is_admin(self):
         return self.can(Permission.ADMIN)
 
     def follow(self, user):
-        if not self.is_following(user):
-            self.following.add(user)
+        """Follow ``user`` and return ``True``, or ``False`` if already following."""
+        if self.is_following(user):
+            return False
+        if not user.is_fanout_on_read():
+            session_of(self).execute(
+                timeline.insert()
+                .prefix_with("OR IGNORE", dialect="sqlite")
+                .from_select(
+                    ["user_id", "post_id", "timestamp"],
+                    db.select(sa.literal(self.id), Post.id, Post.timestamp)
+                    .where(Post.author_id == user.id)
+                    .order_by(Post.timestamp.desc())
+                    .limit(current_app.config["TIMELINE_BACKFILL"]),
+                )
+            )
+            trim_timelines(session_of(self), db.select(sa.literal(self.id)))
+        self.following.add(user)
+        return True
 
     def unfollow(self, user):
-        if self.is_following(user):
-            self.following.remove(user)
+        """Unfollow ``user`` and return ``True``, or ``False`` if not following."""
+        if not self.is_following(user):
+            return False
+        session_of(self).execute(
+            timeline.delete().where(
+                timeline.c.user_id == self.id,
+                timeline.c.post_id.in_(
+                    db.select(Post.id).where(Post.author_id == user.id)
+                ),
+            )
+        )
+        self.following.remove(user)
+        return True
+
+    def is_fanout_on_read(self):
+        if isinstance(sa.inspect(self).dict.get("followed_count"), sa.ColumnElement):
+            # The count has an update pending, flush it to read the new value.
+            session_of(self).flush()
+        return self.followed_count >= current_app.config["TIMELINE_FANOUT_LIMIT"]
 
     def is_following(self, user):
         return (
-            db.session.scalar(self.following.select().filter_by(id=user.id)) is not None
+            session_of(self).scalar(self.following.select().filter_by(id=user.id))
+            is not None
         )
 
     def is_followed_by(self, user):
         return (
-            db.session.scalar(self.followed.select().filter_by(id=user.id)) is not None
+            session_of(self).scalar(self.followed.select().filter_by(id=user.id))
+            is not None
         )
 
-    @property
-    def following_count(self):
-        return db.session.scalar(
-            db.select(sa.func.count()).select_from(self.following.select().subquery())
-        )
+    def is_following_cached(self, user):
+        """Answer ``is_following`` from the follow graph, without a query.
 
-    @property
-    def followed_count(self):
-        return db.session.scalar(
-            db.select(sa.func.count()).select_from(self.followed.select().subquery())
+        The graph can miss the writes of other processes for up to
+        ``FOLLOW_GRAPH_TTL`` seconds, so this is for display only; follows
+        and unfollows must check with ``is_following``.
+        """
+        if self.id is None or user.id is None:
+            return self.is_following(user)
+        # Changes made in this session come first, they reach the follow
+        # graph only once committed.
+        pending = session_of(self).info.get("follows", {}).get((self.id, user.id))
+        if pending is not None:
+            return pending
+        return follow_graph.is_following(self.id, user.id)
+
+    def suggestions(self, count=None):
+        """Return users for this user to follow, see ``FollowGraph``."""
+        ids = follow_graph.suggestions(
+            self.id, count or current_app.config["FOLLOW_SUGGESTIONS"]
         )
+        users = {
+            user.id: user
+            for user in session_of(self).scalars(
+                db.select(User).where(User.id.in_(ids))
+            )
+        }
+        return [users[id] for id in ids if id in users]
 
     @property
     def following_posts(self):
-        Author = so.aliased(User)
-        Following = so.aliased(User)
-        return (
-            db.select(Post)
-            .join(Post.author.of_type(Author))
-            .join(Author.followed.of_type(Following), isouter=True)
-            .where(sa.or_(Following.id == self.id, Author.id == self.id))
-            .group_by(Post)
-        )
+        return self.home_timeline().query
 
-    @property
-    def posts_count(self):
-        return db.session.scalar(
-            db.select(sa.func.count()).select_from(self.posts.subquery())
-        )
+    def home_timeline(self, popular=None):
+        """Return the posts of this user's home timeline as a ``Timeline``.
+
+        Posts are copied into the timeline of every follower when they are
+        written, except for authors followed by more than
+        TIMELINE_FANOUT_LIMIT users, whose posts are merged in on read. The
+        query is ordered by the timeline columns, so a page walks the
+        (user_id, timestamp, post_id) index and stops after ``per_page`` rows.
+
+        ``popular`` lists the ids of the followed authors to merge, and is
+        looked up when ``None``. Only the newest ``TIMELINE_LENGTH`` posts of
+        each are merged, so the merge sorts a bounded number of rows.
+        """
+        if popular is None:
+            popular = (
+                session_of(self)
+                .scalars(
+                    db.select(User.id)
+                    .join(follow, follow.c.following_id == User.id)
+                    .where(
+                        follow.c.followed_id == self.id,
+                        User.followed_count
+                        >= current_app.config["TIMELINE_FANOUT_LIMIT"],
+                    )
+                )
+                .all()
+            )
+        if not popular:
+            entries = timeline
+            query = (
+                db.select(Post)
+                .join(timeline, timeline.c.post_id == Post.id)
+                .where(timeline.c.user_id == self.id)
+            )
+        else:
+            latest = [
+                db.select(Post.id, Post.timestamp)
+                .where(Post.author_id == author_id)
+                .order_by(Post.timestamp.desc())
+                .limit(current_app.config["TIMELINE_LENGTH"])
+                .subquery("latest")
+                for author_id in popular
+            ]
+            entries = sa.union(
+                db.select(timeline.c.post_id, timeline.c.timestamp).where(
+                    timeline.c.user_id == self.id
+                ),
+                *[db.select(*posts.c) for posts in latest],
+            ).subquery("entries")
+            query = db.select(Post).join(entries, entries.c.post_id == Post.id)
+        columns = (entries.c.timestamp, entries.c.post_id)
+        return Timeline(query.order_by(*[column.desc() for column in columns]), columns)
+
+    @staticmethod
+    def rebuild_timelines(chunk_size=1000):
+        limit = current_app.config["TIMELINE_FANOUT_LIMIT"]
+        last_id = db.session.scalar(db.select(sa.func.max(User.id))) or 0
+        for start in range(0, last_id, chunk_size):
+            in_chunk = sa.and_(User.id > start, User.id <= start + chunk_size)
+            db.session.execute(
+                timeline.delete().where(
+                    timeline.c.user_id.in_(db.select(User.id).where(in_chunk))
+                )
+            )
+            own = db.select(
+                Post.author_id.label("user_id"), Post.id, Post.timestamp
+            ).where(Post.author_id.in_(db.select(User.id).where(in_chunk)))
+            followed = (
+                db.select(follow.c.followed_id, Post.id, Post.timestamp)
+                .join(Post, Post.author_id == follow.c.following_id)
+                .join(User, User.id == follow.c.following_id)
+                .where(
+                    follow.c.followed_id > start,
+                    follow.c.followed_id <= start + chunk_size,
+                    User.followed_count < limit,
+                )
+            )
+            entries = sa.union(own, followed).subquery()
+            ranked = db.select(
+                entries.c.user_id,
+                entries.c.id,
+                entries.c.timestamp,
+                sa.func.row_number()
+                .over(
+                    partition_by=entries.c.user_id,
+                    order_by=entries.c.timestamp.desc(),
+                )
+                .label("rank"),
+            ).subquery()
+            db.session.execute(
+                timeline.insert().from_select(
+                    ["user_id", "post_id", "timestamp"],
+                    db.select(ranked.c.user_id, ranked.c.id, ranked.c.timestamp).where(
+                        ranked.c.rank <= current_app.config["TIMELINE_LENGTH"]
+                    ),
+                )
+            )
+            db.session.commit()
+
+    @staticmethod
+    def on_appended_post(target, value, initiator):
+        adjust_counter(target, "posts_count", 1)
+
+    @staticmethod
+    def on_removed_post(target, value, initiator):
+        adjust_counter(target, "posts_count", -1)
+
+    @staticmethod
+    def on_appended_following(target, value, initiator):
+        adjust_counter(target, "following_count", 1)
+        adjust_counter(value, "followed_count", 1)
+        record_follow(target, value, True)
+
+    @staticmethod
+    def on_removed_following(target, value, initiator):
+        adjust_counter(target, "following_count", -1)
+        adjust_counter(value, "followed_count", -1)
+        record_follow(target, value, False)
+
+    @staticmethod
+    def recount(chunk_size=1000):
+        last_id = db.session.scalar(db.select(sa.func.max(User.id))) or 0
+        for start in range(0, last_id, chunk_size):
+            stop = start + chunk_size
+            ids = db.session.scalars(
+                db.select(User.id).where(User.id > start, User.id <= stop)
+            ).all()
+            if not ids:
+                continue
+            posts = count_by(Post.author_id, start, stop)
+            following = count_by(follow.c.followed_id, start, stop)
+            followed = count_by(follow.c.following_id, start, stop)
+            db.session.execute(
+                db.update(User),
+                [
+                    {
+                        "id": id,
+                        "posts_count": posts.get(id, 0),
+                        "following_count": following.get(id, 0),
+                        "followed_count": followed.get(id, 0),
+                    }
+                    for id in ids
+                ],
+            )
+            db.session.commit()
 
     def get_api_token(self, expires_in=600):
-        return jwt.encode(
-            {"user": self.id, "exp": time() + expires_in},
-            current_app.config["SECRET_KEY"],
-            algorithm="HS256",
-        )
+        now = datetime.now(timezone.utc)
+        if self.token and self.token_expiration.replace(
+            tzinfo=timezone.utc
+        ) > now + timedelta(seconds=60):
+            return self.token
+        self.token = secrets.token_hex(16)
+        self.token_expiration = now + timedelta(seconds=expires_in)
+        db.session.add(self)
+        db.session.commit()
+        return self.token
 
     def revoke_token(self):
-        # Need extra token table to revoke user token.
-        pass
+        self.token_expiration = datetime.now(timezone.utc) - timedelta(seconds=1)
+        token_cache.pop(self.token)
+        session_of(self).info.setdefault("revoked_tokens", set()).add(self.token)
 
     @staticmethod
-    def check_api_token(token):
-        try:
-            id = jwt.decode(
-                token, current_app.config["SECRET_KEY"], algorithms=["HS256"]
-            )["user"]
-        except Exception:
+    def check_api_token(token, session=None):
+        # Verified tokens are cached with their user id for API_TOKEN_CACHE_TTL
+        # seconds and the user comes from the identity cache, so a hot client
+        # costs no query at all. Revocation evicts the token here and is seen
+        # by other processes once their entry expires.
+        session = db.session if session is None else session
+        cached = token_cache.get(token)
+        if cached is None:
+            with replicas.primary():
+                user = session.scalar(db.select(User).filter_by(token=token))
+            if user is None:
+                return
+            cached = (user.id, user.token_expiration.replace(tzinfo=timezone.utc))
+            token_cache.set(token, cached)
+            user_cache.set(user.id, snapshot(user))
+        else:
+            user = None
+        user_id, expiration = cached
+        if expiration < datetime.now(timezone.utc):
+            token_cache.pop(token)
             return
-        return db.session.get(User, id)
+        return user or User.cached(user_id, session=session)
+
+    @staticmethod
+    def cached(id, session=None):
+        """Return user ``id`` attached to the session, or ``None``.
 
-    def to_json(self):
+        A detached copy of the row is kept for ``USER_CACHE_TTL`` seconds and
+        merged into the session without a query, so it can be read and written
+        like a loaded user. Any ORM update of the user evicts the copy.
+        """
+        session = db.session if session is None else session
+        user_snapshot = user_cache.get(id)
+        if user_snapshot is not None:
+            return session.merge(user_snapshot, load=False)
+        with replicas.primary():
+            user = session.get(User, id)
+        if user is not None:
+            user_cache.set(id, snapshot(user))
+        return user
+
+    @staticmethod
+    def on_updated(mapper, connection, target):
+        user_cache.pop(target.id)
+        so.object_session(target).info.setdefault("updated_users", set()).add(target.id)
+
+    @staticmethod
+    def on_commit(session):
+        # Until the commit, other requests could cache the old row again.
+        for token in session.info.pop("revoked_tokens", ()):
+            token_cache.pop(token)
+        for id in session.info.pop("updated_users", ()):
+            user_cache.pop(id)
+
+    @staticmethod
+    def on_transaction_end(session, transaction):
+        if transaction.parent is None:
+            session.info.pop("revoked_tokens", None)
+            session.info.pop("updated_users", None)
+
+    @classmethod
+    def json_fields(cls):
         return {
-            "username": self.username,
-            "member_since": self.member_since,
-            "last_seen": self.last_seen,
-            "posts_count": self.posts_count,
-            "_links": {
-                "self": url_for("api.get_user", id=self.id),
-                "posts": url_for("api.get_user_posts", id=self.id),
-                "following_posts": url_for("api.get_user_following_posts", id=self.id),
-            },
+            "username": (cls.username,),
+            "member_since": (cls.member_since,),
+            "last_seen": (cls.last_seen,),
+            "posts_count": (cls.posts_count,),
+            "_links": (cls.id,),
         }
 
+    @staticmethod
+    def json_links():
+        self_url = url_template("api.get_user")
+        posts_url = url_template("api.get_user_posts")
+        following_posts_url = url_template("api.get_following_posts")
+
+        def links(user):
+            return {
+                "self": self_url.format(user.id),
+                "posts": posts_url.format(user.id),
+                "following_posts": following_posts_url.format(user.id),
+            }
+
+        return links
+
 
 class AnonymousUser(AnonymousUserMixin):
     def can(self, perm):
@@ -229,6 +846,9 @@ class Permission:
     ADMIN = 16
 
 
+RoleMap = namedtuple("RoleMap", ["permissions", "ids", "default"])
+
+
 class Role(db.Model):
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
     name: so.Mapped[str] = so.mapped_column(sa.String(64), unique=True)
@@ -250,6 +870,47 @@ class Role(db.Model):
     def has_permission(self, perm):
         return self.permissions & perm == perm
 
+    @staticmethod
+    def cached():
+        """Return the role table as read-only maps, cached per app.
+
+        ``permissions`` maps role ids to permissions, ``ids`` maps role names
+        to ids and ``default`` is the id of the default role. The map is
+        dropped when a session that wrote a role commits, and reloaded every
+        ``ROLE_CACHE_TTL`` seconds to pick up changes made by other processes,
+        such as ``flask deploy``.
+        """
+        cached = current_app.extensions.get("roles")
+        ttl = current_app.config["ROLE_CACHE_TTL"]
+        if cached is not None and monotonic() - cached[1] < ttl:
+            return cached[0]
+        with replicas.primary():
+            rows = db.session.execute(
+                db.select(Role.id, Role.name, Role.permissions, Role.default)
+            ).all()
+        roles = RoleMap(
+            MappingProxyType({row.id: row.permissions for row in rows}),
+            MappingProxyType({row.name: row.id for row in rows}),
+            next((row.id for row in rows if row.default), None),
+        )
+        current_app.extensions["roles"] = (roles, monotonic())
+        return roles
+
+    @staticmethod
+    def on_changed(mapper, connection, target):
+        so.object_session(target).info["roles_changed"] = True
+
+    @staticmethod
+    def on_commit(session):
+        # Until the commit, other requests would load the uncommitted roles.
+        if session.info.pop("roles_changed", False):
+            current_app.extensions.pop("roles", None)
+
+    @staticmethod
+    def on_transaction_end(session, transaction):
+        if transaction.parent is None:
+            session.info.pop("roles_changed", None)
+
     @staticmethod
     def insert_roles():
         roles = {
@@ -282,77 +943,146 @@ class Role(db.Model):
 
 
 class Post(PaginatedAPIMixin, db.Model):
+    __table_args__ = (
+        sa.Index("ix_post_author_id_timestamp", "author_id", "timestamp"),
+    )
+
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
     body: so.Mapped[str] = so.mapped_column(sa.Text)
     body_html: so.Mapped[str] = so.mapped_column(sa.Text)
     timestamp: so.Mapped[datetime] = so.mapped_column(
         index=True, default=lambda: datetime.now(timezone.utc)
     )
+    updated_at: so.Mapped[datetime] = so.mapped_column(
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+    )
     author_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey("user.id"))
     author: so.Mapped["User"] = so.relationship(back_populates="posts")
     comments: so.WriteOnlyMapped["Comment"] = so.relationship(back_populates="post")
+    comments_count: so.Mapped[int] = so.mapped_column(default=0)
 
     @staticmethod
     def on_changed_body(target, value, oldvalue, initiator):
-        allowed_tags = [
-            "a",
-            "abbr",
-            "acronym",
-            "b",
-            "blockquote",
-            "code",
-            "em",
-            "i",
-            "li",
-            "ol",
-            "pre",
-            "strong",
-            "ul",
-            "h1",
-            "h2",
-            "h3",
-            "p",
-        ]
-        target.body_html = bleach.linkify(
-            bleach.clean(
-                markdown(value, output_format="html"), tags=allowed_tags, strip=True
+        target.body_html = render(value, POST_TAGS)
+        if target.id is not None:
+            invalidate_post(target.id)
+
+    @staticmethod
+    def on_inserted(mapper, connection, target):
+        followers = db.select(follow.c.followed_id).where(
+            follow.c.following_id == target.author_id,
+            db.select(User.followed_count)
+            .where(User.id == target.author_id)
+            .scalar_subquery()
+            < current_app.config["TIMELINE_FANOUT_LIMIT"],
+        )
+        connection.execute(
+            timeline.insert().values(
+                user_id=target.author_id, post_id=target.id, timestamp=target.timestamp
             )
         )
-
-    @property
-    def comments_count(self):
-        return db.session.scalar(
-            db.select(sa.func.count()).select_from(self.comments.select().subquery())
+        connection.execute(
+            timeline.insert().from_select(
+                ["user_id", "post_id", "timestamp"],
+                followers.with_only_columns(
+                    follow.c.followed_id,
+                    sa.literal(target.id),
+                    sa.literal(target.timestamp, sa.DateTime),
+                ),
+            )
         )
+        # Trimming every timeline the post reached would walk TIMELINE_LENGTH
+        # entries per follower. Each post trims the timelines of a different
+        # slice of users instead, so each timeline is trimmed about once per
+        # TIMELINE_TRIM_INTERVAL posts it receives and can grow that much
+        # past TIMELINE_LENGTH in between.
+        interval = current_app.config["TIMELINE_TRIM_INTERVAL"]
+        users = followers.where(follow.c.followed_id % interval == target.id % interval)
+        if target.author_id % interval == target.id % interval:
+            users = users.union(db.select(sa.literal(target.author_id)))
+        trim_timelines(connection, users)
 
-    def to_json(self):
+    @staticmethod
+    def on_appended_comment(target, value, initiator):
+        adjust_counter(target, "comments_count", 1)
+
+    @staticmethod
+    def on_removed_comment(target, value, initiator):
+        adjust_counter(target, "comments_count", -1)
+
+    @staticmethod
+    def recount(chunk_size=1000):
+        last_id = db.session.scalar(db.select(sa.func.max(Post.id))) or 0
+        for start in range(0, last_id, chunk_size):
+            stop = start + chunk_size
+            ids = db.session.scalars(
+                db.select(Post.id).where(Post.id > start, Post.id <= stop)
+            ).all()
+            if not ids:
+                continue
+            comments = count_by(Comment.post_id, start, stop)
+            db.session.execute(
+                db.update(Post),
+                [{"id": id, "comments_count": comments.get(id, 0)} for id in ids],
+            )
+            db.session.commit()
+
+    @classmethod
+    def json_fields(cls):
         return {
-            "body": self.body,
-            "body_html": self.body_html,
-            "timestamp": self.timestamp,
-            "comments_count": self.comments_count,
-            "_links": {
-                "self": url_for("api.get_post", id=self.id),
-                "author": url_for("api.get_user", id=self.author_id),
-                "comments": url_for("api.get_post_comments", id=self.id),
-            },
+            "body": (cls.body,),
+            "body_html": (cls.body_html,),
+            "timestamp": (cls.timestamp,),
+            "comments_count": (cls.comments_count,),
+            "_links": (cls.id, cls.author_id),
         }
 
+    @classmethod
+    def json_embeds(cls):
+        return {
+            "author": ((cls.author_id,), embed_authors),
+            "comments": ((cls.id,), embed_comments),
+        }
+
+    @staticmethod
+    def json_links():
+        self_url = url_template("api.get_post")
+        author_url = url_template("api.get_user")
+        comments_url = url_template("api.get_post_comments")
+
+        def links(post):
+            return {
+                "self": self_url.format(post.id),
+                "author": author_url.format(post.author_id),
+                "comments": comments_url.format(post.id),
+            }
+
+        return links
+
     @staticmethod
     def from_json(post):
         body = post.get("body")
         if body is None or body == "":
             raise ValidationError("post does not have a body")
+        if not isinstance(body, str):
+            raise ValidationError("post body must be a string")
         return Post(body=body)
 
 
 class Comment(PaginatedAPIMixin, db.Model):
+    __table_args__ = (sa.Index("ix_comment_post_id_timestamp", "post_id", "timestamp"),)
+
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
     body: so.Mapped[str] = so.mapped_column(sa.Text)
     body_html: so.Mapped[str] = so.mapped_column(sa.Text)
     timestamp: so.Mapped[datetime] = so.mapped_column(
         index=True, default=lambda: datetime.now(timezone.utc)
     )
+    updated_at: so.Mapped[datetime] = so.mapped_column(
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+    )
     disabled: so.Mapped[Optional[bool]]
     author_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey("user.id"))
     author: so.Mapped["User"] = so.relationship(back_populates="comments")
@@ -361,26 +1091,58 @@ class Comment(PaginatedAPIMixin, db.Model):
 
     @staticmethod
     def on_changed_body(target, value, oldvalue, initiator):
-        allowed_tags = ["a", "abbr", "acronym", "b", "code", "em", "i", "strong"]
-        target.body_html = bleach.linkify(
-            bleach.clean(
-                markdown(value, output_format="html"), tags=allowed_tags, strip=True
-            )
-        )
+        target.body_html = render(value, COMMENT_TAGS)
+        if target.id is not None:
+            invalidate_comment(target.id)
 
-    def to_json(self):
+    @classmethod
+    def json_fields(cls):
         return {
-            "body": self.body,
-            "body_html": self.body_html,
-            "timestamp": self.timestamp,
-            "disabled": self.disabled,
-            "_links": {
-                "self": url_for("api.get_comment", id=self.id),
-                "author": url_for("api.get_user", id=self.author_id),
-                "post": url_for("api.get_post", id=self.post_id),
-            },
+            "body": (cls.body,),
+            "body_html": (cls.body_html,),
+            "timestamp": (cls.timestamp,),
+            "disabled": (cls.disabled,),
+            "_links": (cls.id, cls.author_id, cls.post_id),
         }
 
+    @classmethod
+    def json_embeds(cls):
+        return {"author": ((cls.author_id,), embed_authors)}
+
+    @staticmethod
+    def json_links():
+        self_url = url_template("api.get_comment")
+        author_url = url_template("api.get_user")
+        post_url = url_template("api.get_post")
+
+        def links(comment):
+            return {
+                "self": self_url.format(comment.id),
+                "author": author_url.format(comment.author_id),
+                "post": post_url.format(comment.post_id),
+            }
+
+        return links
+
 
 db.event.listen(Post.body, "set", Post.on_changed_body)
 db.event.listen(Comment.body, "set", Comment.on_changed_body)
+db.event.listen(User.posts, "append", User.on_appended_post)
+db.event.listen(User.posts, "remove", User.on_removed_post)
+db.event.listen(User.following, "append", User.on_appended_following)
+db.event.listen(User.following, "remove", User.on_removed_following)
+db.event.listen(Post, "after_insert", Post.on_inserted)
+db.event.listen(User, "after_update", User.on_updated)
+db.event.listen(Role, "after_insert", Role.on_changed)
+db.event.listen(Role, "after_update", Role.on_changed)
+db.event.listen(Role, "after_delete", Role.on_changed)
+db.event.listen(Post.comments, "append", Post.on_appended_comment)
+db.event.listen(Post.comments, "remove", Post.on_removed_comment)
+db.event.listen(so.Session, "after_commit", User.on_commit)
+db.event.listen(so.Session, "after_transaction_end", User.on_transaction_end)
+db.event.listen(so.Session, "after_commit", Role.on_commit)
+db.event.listen(so.Session, "after_transaction_end", Role.on_transaction_end)
+db.event.listen(so.Session, "after_commit", follow_graph.on_commit)
+db.event.listen(so.Session, "after_transaction_end", follow_graph.on_transaction_end)
+searchable(Post)
+searchable(Comment)
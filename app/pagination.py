@@ -0,0 +1,121 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+import sqlalchemy as sa
+from flask import abort
+from flask_sqlalchemy.pagination import SelectPagination
+
+from app.extensions import db
+
+
+def encode_cursor(direction, values):
+    payload = [
+        direction,
+        [
+            value.isoformat() if isinstance(value, datetime) else value
+            for value in values
+        ],
+    ]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, columns):
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        direction, values = json.loads(payload)
+        if (
+            direction not in ("next", "prev")
+            or not isinstance(values, list)
+            or len(values) != len(columns)
+        ):
+            raise ValueError(direction)
+        values = [
+            decode_value(value, column.type.python_type)
+            for column, value in zip(columns, values)
+        ]
+    except (binascii.Error, TypeError, ValueError):
+        abort(400)
+    return direction, values
+
+
+def decode_value(value, python_type):
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    # Booleans pass isinstance() for int, but are never valid keys.
+    if not isinstance(value, python_type) or isinstance(value, bool):
+        raise TypeError(value)
+    return value
+
+
+class RowPagination(SelectPagination):
+    """Offset pagination of a select of columns, with plain rows as items."""
+
+    def _query_items(self):
+        select = self._query_args["select"]
+        select = select.limit(self.per_page).offset(self._query_offset)
+        return list(self._query_args["session"].execute(select))
+
+    def _query_count(self):
+        sub = self._query_args["select"].order_by(None).subquery()
+        return self._query_args["session"].scalar(
+            sa.select(sa.func.count()).select_from(sub)
+        )
+
+
+class CursorPagination:
+    """Keyset pagination over a query ordered by ``columns`` descending.
+
+    Pages are found with a range condition on the key columns instead of an
+    OFFSET, so deep pages cost the same as the first one, and no ``COUNT(*)``
+    is issued. ``cursor`` is an opaque token from ``next_cursor`` or
+    ``prev_cursor``; an empty cursor starts at the newest item. With ``rows``
+    the items are the rows of a select of columns instead of instances.
+    ``keys`` names the attributes of the items holding the values of
+    ``columns``, their keys by default.
+    """
+
+    def __init__(
+        self, query, columns, cursor, per_page, session=None, rows=False, keys=None
+    ):
+        self.columns = columns
+        self.keys = keys or [column.key for column in columns]
+        self.cursor = cursor or None
+        self.per_page = per_page
+        query = query.order_by(None)
+        key = sa.tuple_(*columns)
+        direction = None
+        if self.cursor:
+            direction, values = decode_cursor(self.cursor, columns)
+            if direction == "next":
+                query = query.where(key < tuple(values))
+            else:
+                query = query.where(key > tuple(values))
+        if direction == "prev":
+            query = query.order_by(*[column.asc() for column in columns])
+        else:
+            query = query.order_by(*[column.desc() for column in columns])
+        session = db.session if session is None else session
+        fetch = session.execute if rows else session.scalars
+        items = list(fetch(query.limit(per_page + 1)))
+        more = len(items) > per_page
+        items = items[:per_page]
+        if direction == "prev":
+            items.reverse()
+            self.has_prev, self.has_next = more, True
+        else:
+            self.has_prev, self.has_next = direction == "next", more
+        self.items = items
+        self.next_cursor = (
+            self._cursor("next", items[-1]) if self.has_next and items else None
+        )
+        self.prev_cursor = (
+            self._cursor("prev", items[0]) if self.has_prev and items else None
+        )
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def _cursor(self, direction, item):
+        return encode_cursor(direction, [getattr(item, key) for key in self.keys])
@@ -0,0 +1,77 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha256
+from itertools import repeat
+
+import bleach
+from markdown import markdown
+
+from app.cache import LRUCache
+
+POST_TAGS = frozenset(
+    [
+        "a",
+        "abbr",
+        "acronym",
+        "b",
+        "blockquote",
+        "code",
+        "em",
+        "i",
+        "li",
+        "ol",
+        "pre",
+        "strong",
+        "ul",
+        "h1",
+        "h2",
+        "h3",
+        "p",
+    ]
+)
+COMMENT_TAGS = frozenset(["a", "abbr", "acronym", "b", "code", "em", "i", "strong"])
+
+_cache = LRUCache(maxsize=4096)
+
+
+def _render(body, tags):
+    return bleach.linkify(
+        bleach.clean(markdown(body, output_format="html"), tags=tags, strip=True)
+    )
+
+
+def render(body, tags):
+    """Render Markdown ``body`` to HTML keeping only ``tags``.
+
+    Results are cached by a hash of the body and the tag set, so re-saving
+    an unchanged body or rendering a common one again is a dict lookup.
+    """
+    key = (sha256(body.encode("utf-8")).digest(), tags)
+    html = _cache.get(key)
+    if html is None:
+        html = _render(body, tags)
+        _cache.set(key, html)
+    return html
+
+
+def render_pool(processes=None):
+    """Return a process pool for ``render_many``.
+
+    Workers are spawned rather than forked, since the app runs background
+    threads (mail workers, the last_seen flusher) that a forked child would
+    inherit in a broken state.
+    """
+    return ProcessPoolExecutor(
+        processes, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def render_many(bodies, tags, executor=None, chunksize=64):
+    """Render a batch of bodies, in parallel when given a process pool.
+
+    Bulk jobs (``flask rerender``, ``flask fake``) go through here. They do
+    not touch the cache, since a full re-render would just churn it.
+    """
+    if executor is None:
+        return [_render(body, tags) for body in bodies]
+    return list(executor.map(_render, bodies, repeat(tags), chunksize=chunksize))
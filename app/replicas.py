@@ -0,0 +1,109 @@
+import random
+from contextlib import contextmanager
+from time import time
+
+import sqlalchemy as sa
+from flask import current_app, g, request, session
+from flask_sqlalchemy.session import Session
+
+from app.cache import LRUCache
+
+
+class RoutingSession(Session):
+    """A session that reads from the replica picked for the request.
+
+    Flushes, DML statements and everything after the session's first write
+    go to the primary, so a request always reads its own writes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or getattr(clause, "is_dml", False):
+                self.info["wrote"] = True
+            elif (
+                not self.info.get("wrote")
+                and g.get("replica") is not None
+                and not g.get("on_primary")
+            ):
+                return g.replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class Replicas:
+    """Route read-only requests to the ``SQLALCHEMY_REPLICAS`` databases.
+
+    GET and HEAD requests read from a random replica unless their view is
+    marked with ``use_primary``. A request that wrote to the primary pins the
+    client's session to the primary for ``REPLICA_PIN_SECONDS``, the time the
+    replicas are allowed to lag behind. API clients don't send the session
+    cookie back, so the user who wrote is pinned in this process as well.
+    ``route`` sends the requests of a pinned session user to the primary, and
+    the API calls ``check_pin`` once a token is authenticated.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        options = app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})
+        engines = [
+            sa.create_engine(url, **options)
+            for url in app.config["SQLALCHEMY_REPLICAS"]
+        ]
+        app.extensions["replicas"] = engines
+        app.extensions["replica_pins"] = LRUCache(
+            app.config["REPLICA_PIN_CACHE_SIZE"], app.config["REPLICA_PIN_SECONDS"]
+        )
+        if engines:
+            app.before_request(self.route)
+            app.after_request(self.pin)
+
+    def route(self):
+        # The session user is checked here rather than when it is loaded, as
+        # blueprint hooks may load it before this function runs.
+        user_id = session.get("_user_id")
+        if (
+            request.method in ("GET", "HEAD")
+            and session.get("primary_until", 0) < time()
+            and not (user_id is not None and self.is_pinned(int(user_id)))
+            and not getattr(
+                current_app.view_functions.get(request.endpoint), "use_primary", False
+            )
+        ):
+            g.replica = random.choice(current_app.extensions["replicas"])
+
+    def pin(self, response):
+        from app.extensions import db
+
+        if db.session.registry.has() and db.session.info.get("wrote"):
+            session["primary_until"] = (
+                time() + current_app.config["REPLICA_PIN_SECONDS"]
+            )
+            # g.current_user is the API user, g._login_user the session one.
+            user = g.get("current_user") or g.get("_login_user")
+            if getattr(user, "id", None) is not None:
+                current_app.extensions["replica_pins"].set(user.id, True)
+        return response
+
+    def is_pinned(self, user_id):
+        return bool(current_app.extensions["replica_pins"].get(user_id))
+
+    def check_pin(self, user_id):
+        """Send the rest of the request to the primary if ``user_id`` is pinned."""
+        if self.is_pinned(user_id):
+            g.pop("replica", None)
+
+    @contextmanager
+    def primary(self):
+        """Read from the primary inside the block.
+
+        For loads into caches shared by the whole process, which would
+        otherwise keep what a lagging replica returned.
+        """
+        on_primary = g.get("on_primary", False)
+        g.on_primary = True
+        try:
+            yield
+        finally:
+            g.on_primary = on_primary
@@ -0,0 +1,93 @@
+import sqlalchemy as sa
+
+from app.extensions import db
+
+indexes = {}
+
+
+def create_ddl(fts):
+    return sa.DDL(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts.name} "
+        "USING fts5(body, tokenize='porter unicode61')"
+    ).execute_if(dialect="sqlite")
+
+
+def searchable(model):
+    """Keep an SQLite FTS5 index of ``model.body`` in ``<table>_fts``.
+
+    The index is created and dropped with the model's table, and holds each
+    row's body under the row's id. It is written by the model's insert,
+    update and delete events, within the flush that changes the row.
+    """
+    table = model.__table__
+    fts = sa.table(
+        f"{table.name}_fts", sa.column("rowid"), sa.column("body"), sa.column("rank")
+    )
+    indexes[model] = fts
+    sa.event.listen(table, "after_create", create_ddl(fts))
+    sa.event.listen(
+        table,
+        "after_drop",
+        sa.DDL(f"DROP TABLE IF EXISTS {fts.name}").execute_if(dialect="sqlite"),
+    )
+    sa.event.listen(model, "after_insert", on_inserted)
+    sa.event.listen(model, "after_update", on_updated)
+    sa.event.listen(model, "after_delete", on_deleted)
+
+
+def on_inserted(mapper, connection, target):
+    if connection.dialect.name == "sqlite":
+        fts = indexes[mapper.class_]
+        connection.execute(fts.insert().values(rowid=target.id, body=target.body))
+
+
+def on_updated(mapper, connection, target):
+    if (
+        connection.dialect.name == "sqlite"
+        and sa.inspect(target).attrs.body.history.has_changes()
+    ):
+        fts = indexes[mapper.class_]
+        connection.execute(
+            fts.update().where(fts.c.rowid == target.id).values(body=target.body)
+        )
+
+
+def on_deleted(mapper, connection, target):
+    if connection.dialect.name == "sqlite":
+        fts = indexes[mapper.class_]
+        connection.execute(fts.delete().where(fts.c.rowid == target.id))
+
+
+def matching(model, text):
+    """Return a query for the ``model`` rows matching every word of ``text``.
+
+    Words are quoted, so FTS5 operators in user input are searched for as
+    plain text. Results are ordered by relevance, best match first.
+    """
+    fts = indexes[model]
+    terms = " ".join('"{}"'.format(word.replace('"', '""')) for word in text.split())
+    return (
+        db.select(model)
+        .join(fts, fts.c.rowid == model.id)
+        .where(fts.c.body.match(terms))
+        .order_by(fts.c.rank)
+    )
+
+
+def rebuild(chunk_size):
+    """Rebuild every index from its table, ``chunk_size`` rows per commit."""
+    for model, fts in indexes.items():
+        db.session.execute(create_ddl(fts))
+        db.session.execute(fts.delete())
+        last_id = db.session.scalar(db.select(sa.func.max(model.id))) or 0
+        for start in range(0, last_id, chunk_size):
+            db.session.execute(
+                fts.insert().from_select(
+                    ["rowid", "body"],
+                    db.select(model.id, model.body).where(
+                        model.id > start, model.id <= start + chunk_size
+                    ),
+                )
+            )
+            db.session.commit()
+        db.session.commit()
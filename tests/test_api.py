@@ -1,9 +1,16 @@
+import base64
 import json
+import re
 import unittest
+from datetime import datetime, timedelta
 
 from app import create_app
 from app.extensions import db
-from app.models import Role, User
+from app.models import Comment, Post, Role, User
+
+
+def queries_in(response):
+    return int(re.search(r'desc="(\d+) queries"', response.headers["Server-Timing"])[1])
 
 
 class APITestCase(unittest.TestCase):
@@ -27,6 +34,14 @@ class APITestCase(unittest.TestCase):
         )
         self.assertEqual(response.status_code, 401)
 
+    def test_bad_token(self):
+        for token in ("bad", ["bad"], {"bad": 1}, 1):
+            response = self.client.get("/api/posts", json={"token": token})
+            self.assertEqual(response.status_code, 401)
+            self.assertEqual(
+                response.get_json()["message"], "Invalid authentication token."
+            )
+
     def test_posts(self):
         # add new user
         role = db.session.scalar(db.select(Role).filter_by(name="User"))
@@ -57,3 +72,295 @@ class APITestCase(unittest.TestCase):
         self.assertEqual(
             json_response["body_html"], "<p>body of the <em>blog</em> post</p>"
         )
+
+    def test_cursor_pagination(self):
+        user = User(
+            email="susan@example.com", username="susan", password="cat", confirmed=True
+        )
+        start = datetime(2024, 1, 1)
+        for i in range(25):
+            post = Post(body=f"post {i}", author=user)
+            post.timestamp = start + timedelta(minutes=i // 2)
+            db.session.add(post)
+        db.session.commit()
+        token = user.get_api_token()
+        bodies = []
+        url = f"/api/users/{user.id}/posts?cursor="
+        while url:
+            response = self.client.get(url, json={"token": token})
+            self.assertEqual(response.status_code, 200)
+            json_response = response.get_json()
+            self.assertNotIn("total_items", json_response["_meta"])
+            bodies.extend(item["body"] for item in json_response["items"])
+            last = json_response
+            url = json_response["_links"]["next"]
+        self.assertEqual(bodies, [f"post {i}" for i in reversed(range(25))])
+        response = self.client.get(last["_links"]["prev"], json={"token": token})
+        self.assertEqual(
+            [item["body"] for item in response.get_json()["items"]],
+            bodies[10:20],
+        )
+        response = self.client.get(
+            f"/api/users/{user.id}/posts?cursor=bad", json={"token": token}
+        )
+        self.assertEqual(response.status_code, 400)
+        for values in (
+            [{"a": 1}],
+            ["2024-01-01T00:00:00", [1]],
+            ["2024-01-01T00:00:00", True],
+            {"a": 1, "b": 2},
+        ):
+            cursor = base64.urlsafe_b64encode(json.dumps(["next", values]).encode())
+            response = self.client.get(
+                f"/api/users?cursor={cursor.decode()}", json={"token": token}
+            )
+            self.assertEqual(response.status_code, 400)
+            response = self.client.get(
+                f"/api/users/{user.id}/posts?cursor={cursor.decode()}",
+                json={"token": token},
+            )
+            self.assertEqual(response.status_code, 400)
+
+    def test_token_revocation(self):
+        user = User(
+            email="susan@example.com", username="susan", password="cat", confirmed=True
+        )
+        db.session.add(user)
+        db.session.commit()
+        token = user.get_api_token()
+        self.assertEqual(len(token), 32)
+        self.assertEqual(user.get_api_token(), token)
+        response = self.client.get(f"/api/users/{user.id}", json={"token": token})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.delete("/api/tokens", json={"token": token})
+        self.assertEqual(response.status_code, 204)
+        response = self.client.get(f"/api/users/{user.id}", json={"token": token})
+        self.assertEqual(response.status_code, 401)
+        self.assertNotEqual(user.get_api_token(), token)
+
+    def test_stream_posts(self):
+        user = User(
+            email="susan@example.com", username="susan", password="cat", confirmed=True
+        )
+        db.session.add_all([Post(body=f"post {i}", author=user) for i in range(3)])
+        db.session.commit()
+        response = self.client.get(
+            "/api/posts",
+            json={"token": user.get_api_token()},
+            headers={"Accept": "application/x-ndjson"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual(
+            [json.loads(line)["body"] for line in lines],
+            ["post 0", "post 1", "post 2"],
+        )
+
+    def test_conditional_get(self):
+        user = User(
+            email="susan@example.com", username="susan", password="cat", confirmed=True
+        )
+        post = Post(body="body", author=user)
+        db.session.add(post)
+        db.session.commit()
+        token = user.get_api_token()
+        url = f"/api/posts/{post.id}"
+        response = self.client.get(url, json={"token": token})
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers["ETag"]
+        self.assertIsNotNone(response.last_modified)
+        response = self.client.get(
+            url, json={"token": token}, headers={"If-None-Match": etag}
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.get_data(), b"")
+        response = self.client.put(url, json={"token": token, "body": "new body"})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            url, json={"token": token}, headers={"If-None-Match": etag}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertEqual(response.json["body"], "new body")
+
+    def test_batch(self):
+        user = User(
+            email="susan@example.com", username="susan", password="cat", confirmed=True
+        )
+        db.session.add(user)
+        db.session.commit()
+        token = {"token": user.get_api_token()}
+
+        response = self.client.post(
+            "/api/posts/batch",
+            json={
+                **token,
+                "posts": [{"body": "one"}, {"body": ""}, "three", {"body": 4}],
+            },
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.get_json()["errors"],
+            [
+                {"index": 1, "message": "post does not have a body"},
+                {"index": 2, "message": "post must be an object"},
+                {"index": 3, "message": "post body must be a string"},
+            ],
+        )
+        self.assertEqual(db.session.scalar(db.select(db.func.count(Post.id))), 0)
+
+        response = self.client.post(
+            "/api/posts/batch",
+            json={**token, "posts": [{"body": "*one*"}, {"body": "two"}]},
+        )
+        self.assertEqual(response.status_code, 201)
+        posts = response.get_json()["posts"]
+        self.assertEqual(
+            [post["body_html"] for post in posts], ["<p><em>one</em></p>", "<p>two</p>"]
+        )
+
+        response = self.client.get("/api/posts?ids=2,5,1,2", json=token)
+        self.assertEqual(response.status_code, 200)
+        json_response = response.get_json()
+        self.assertEqual(
+            [post["body"] for post in json_response["items"]], ["two", "*one*"]
+        )
+        self.assertEqual(json_response["missing"], [5])
+        response = self.client.get(f"/api/users?ids={user.id}", json=token)
+        self.assertEqual(response.get_json()["items"][0]["username"], "susan")
+        response = self.client.get("/api/users?ids=1,x", json=token)
+        self.assertEqual(response.status_code, 400)
+
+    def test_comments(self):
+        user = User(
+            email="susan@example.com", username="susan", password="cat", confirmed=True
+        )
+        post = Post(body="post", author=user)
+        db.session.add(Comment(body="*comment*", post=post, author=user))
+        db.session.commit()
+        token = {"token": user.get_api_token()}
+        response = self.client.get(f"/api/posts/{post.id}/comments", json=token)
+        self.assertEqual(response.status_code, 200)
+        [item] = response.get_json()["items"]
+        self.assertEqual(item["body_html"], "<em>comment</em>")
+        self.assertEqual(
+            item["_links"],
+            {
+                "self": "/api/comments/1",
+                "author": f"/api/users/{user.id}",
+                "post": f"/api/posts/{post.id}",
+            },
+        )
+        response = self.client.get(item["_links"]["self"], json=token)
+        self.assertEqual(response.get_json(), item)
+
+    def test_fields(self):
+        user = User(
+            email="susan@example.com", username="susan", password="cat", confirmed=True
+        )
+        db.session.add_all([Post(body=f"post {i}", author=user) for i in range(12)])
+        db.session.commit()
+        token = {"token": user.get_api_token()}
+
+        response = self.client.get(
+            f"/api/users/{user.id}/posts?fields=timestamp,body", json=token
+        )
+        self.assertEqual(response.status_code, 200)
+        json_response = response.get_json()
+        self.assertEqual(set(json_response["items"][0]), {"body", "timestamp"})
+        self.assertIn("fields=body,timestamp", json_response["_links"]["next"])
+        response = self.client.get(json_response["_links"]["next"], json=token)
+        self.assertEqual(set(response.get_json()["items"][0]), {"body", "timestamp"})
+
+        response = self.client.get(
+            f"/api/users/{user.id}?fields=username,_links", json=token
+        )
+        self.assertEqual(set(response.get_json()), {"username", "_links"})
+        response = self.client.get("/api/posts?ids=1&fields=body", json=token)
+        self.assertEqual(response.get_json()["items"], [{"body": "post 0"}])
+        response = self.client.get("/api/posts/1?fields=body,password", json=token)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()["message"], "unknown fields: password")
+        response = self.client.get("/api/posts/1?fields=", json=token)
+        self.assertEqual(response.status_code, 400)
+
+        # Writes check the fields before changing anything.
+        john = User(email="john@example.com", username="john", password="dog")
+        db.session.add(john)
+        db.session.commit()
+        response = self.client.post(
+            "/api/posts?fields=password", json={**token, "body": "new"}
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.put(
+            "/api/posts/1?fields=password", json={**token, "body": "new"}
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(f"/api/follow/{john.id}?fields=", json=token)
+        self.assertEqual(response.status_code, 400)
+        db.session.rollback()
+        self.assertEqual(db.session.scalar(db.select(db.func.count(Post.id))), 12)
+        self.assertEqual(db.session.get(Post, 1).body, "post 0")
+        self.assertFalse(user.is_following(john))
+
+    def test_embed(self):
+        susan = User(
+            email="susan@example.com", username="susan", password="cat", confirmed=True
+        )
+        john = User(email="john@example.com", username="john", password="dog")
+        posts = [Post(body=f"post {i}", author=susan) for i in range(3)]
+        db.session.add_all(posts)
+        db.session.add_all(
+            [
+                Comment(body=f"comment {i}", post=posts[0], author=john)
+                for i in range(12)
+            ]
+        )
+        db.session.commit()
+        token = {"token": susan.get_api_token()}
+
+        response = self.client.get(
+            f"/api/posts/{posts[0].id}?embed=author,comments", json=token
+        )
+        self.assertEqual(response.status_code, 200)
+        embedded = response.get_json()["_embedded"]
+        self.assertEqual(embedded["author"]["username"], "susan")
+        self.assertEqual(len(embedded["comments"]), 10)
+        etag = response.headers["ETag"]
+        db.session.add(Comment(body="new", post=posts[0], author=john))
+        db.session.commit()
+        response = self.client.get(
+            f"/api/posts/{posts[0].id}?embed=author,comments",
+            json=token,
+            headers={"If-None-Match": etag},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["_embedded"]["comments"][0]["body"], "new")
+
+        def queries(url):
+            response = self.client.get(url, json=token)
+            return response, queries_in(response)
+
+        url = f"/api/users/{susan.id}/posts?fields=body"
+        _, plain = queries(url)
+        response, embedding = queries(url + "&embed=comments,author")
+        # One query per embedded relation, for the whole page.
+        self.assertEqual(embedding, plain + 2)
+        json_response = response.get_json()
+        self.assertEqual(
+            [len(item["_embedded"]["comments"]) for item in json_response["items"]],
+            [10, 0, 0],
+        )
+        self.assertIn("embed=author,comments", json_response["_links"]["self"])
+
+        response = self.client.get(
+            f"/api/posts/{posts[0].id}/comments?embed=author", json=token
+        )
+        authors = {
+            item["_embedded"]["author"]["username"]
+            for item in response.get_json()["items"]
+        }
+        self.assertEqual(authors, {"john"})
+        response = self.client.get("/api/posts/1?embed=likes", json=token)
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from app import create_app
+from app.config import TestingConfig, config
+from app.extensions import db
+from app.models import Post, Role, User
+
+
+class AsyncAPITestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+        class FileConfig(TestingConfig):
+            SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(
+                self.tmpdir, "db.sqlite"
+            )
+
+        with mock.patch.dict(config, {"file": FileConfig}):
+            self.app = create_app("file")
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            Role.insert_roles()
+            susan = User(email="susan@example.com", username="susan", password="cat")
+            john = User(email="john@example.com", username="john", password="dog")
+            db.session.add_all([susan, john])
+            db.session.add_all([Post(body=f"post {i}", author=john) for i in range(3)])
+            db.session.commit()
+            susan.follow(john)
+            db.session.commit()
+            self.susan_id, self.john_id = susan.id, john.id
+            self.token = {"token": susan.get_api_token()}
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.engine.dispose()
+        shutil.rmtree(self.tmpdir)
+
+    def get(self, url):
+        response = self.client.get(url, json=self.token)
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def test_reads_match_sync_api(self):
+        self.assertEqual(self.get("/api/async/posts"), self.get("/api/posts"))
+        self.assertEqual(self.get("/api/async/posts/1"), self.get("/api/posts/1"))
+        for url in (
+            f"/users/{self.john_id}/posts",
+            f"/users/{self.susan_id}/following-posts",
+        ):
+            sync, async_ = self.get("/api" + url), self.get("/api/async" + url)
+            self.assertEqual(len(async_["items"]), 3)
+            self.assertEqual(async_["items"], sync["items"])
+            self.assertEqual(async_["_meta"], sync["_meta"])
+            self.assertEqual(
+                async_["_links"]["self"], f"/api/async{url}?page=1&per_page=10"
+            )
+
+    def test_follow(self):
+        url = f"/api/async/follow/{self.john_id}"
+        response = self.client.delete(url, json=self.token)
+        self.assertEqual(response.status_code, 204)
+        with self.app.app_context():
+            susan = db.session.get(User, self.susan_id)
+            self.assertFalse(susan.is_following(db.session.get(User, self.john_id)))
+            self.assertEqual(susan.following_count, 0)
+        response = self.client.post(f"{url}?fields=password", json=self.token)
+        self.assertEqual(response.status_code, 400)
+        with self.app.app_context():
+            susan = db.session.get(User, self.susan_id)
+            self.assertFalse(susan.is_following(db.session.get(User, self.john_id)))
+        response = self.client.post(url, json=self.token)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["username"], "john")
+        self.assertEqual(
+            len(self.get(f"/api/async/users/{self.susan_id}/following-posts")["items"]),
+            3,
+        )
+
+    def test_errors(self):
+        response = self.client.get("/api/async/posts", json={"token": "bad"})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(
+            response.get_json()["message"], "Invalid authentication token."
+        )
+        response = self.client.get("/api/async/posts", json={"token": ["bad"]})
+        self.assertEqual(response.status_code, 401)
+        response = self.client.get("/api/async/posts", json={})
+        self.assertEqual(response.status_code, 401)
+        response = self.client.get("/api/async/posts/100", json=self.token)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.get_json(), {"error": "Not Found"})
@@ -0,0 +1,34 @@
+import unittest
+
+import sqlalchemy as sa
+
+from app import create_app
+from app.audit import audit
+from app.extensions import db
+from app.models import Role
+
+
+class QueryAuditTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_hot_queries_use_indexes(self):
+        problems = {name: problems for name, _, problems in audit() if problems}
+        self.assertEqual(problems, {})
+
+    def test_missing_index_is_flagged(self):
+        db.session.execute(sa.text("DROP INDEX ix_comment_post_id_timestamp"))
+        problems = {name: problems for name, _, problems in audit() if problems}
+        self.assertIn("post comments", problems)
+        result = self.app.test_cli_runner().invoke(args=["query-audit"])
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("FAIL  post comments", result.output)
@@ -0,0 +1,32 @@
+import unittest
+
+from app import create_app
+from app.bench import Benchmark, compare
+
+
+class BenchmarkTestCase(unittest.TestCase):
+    def test_benchmark_reports_every_endpoint(self):
+        benchmark = Benchmark(create_app("testing"), scale=0.1, requests=4, warmup=1)
+        benchmark.seed_data()
+        results = benchmark.report(benchmark.run(), benchmark.serialization(1))
+        self.assertEqual(
+            set(results["endpoints"]),
+            {
+                "index",
+                "post",
+                "user",
+                "api posts",
+                "api post",
+                "api following posts",
+                "follow",
+                "api follow",
+            },
+        )
+        for result in results["endpoints"].values():
+            self.assertGreater(result["requests_per_second"], 0)
+            self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+            self.assertGreater(result["queries_per_request"], 0)
+        self.assertEqual(len(list(compare(results, results))), 8)
+        self.assertEqual(set(results["serialization"]), {"user", "post"})
+        for result in results["serialization"].values():
+            self.assertGreater(result["rows"], 0)
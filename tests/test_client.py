@@ -1,7 +1,10 @@
 import re
 import unittest
 
+import sqlalchemy as sa
+
 from app import create_app, db
+from app.extensions import load_user, token_cache, user_cache
 from app.models import Role, User
 
 
@@ -60,3 +63,49 @@ class FlaskClientTestCase(unittest.TestCase):
         response = self.client.get("/auth/logout", follow_redirects=True)
         self.assertEqual(response.status_code, 200)
         self.assertTrue("Please log in" in response.get_data(as_text=True))
+
+    def test_identity_cache(self):
+        user = User(
+            email="susan@example.com", username="susan", password="cat", confirmed=True
+        )
+        db.session.add(user)
+        db.session.commit()
+        self.assertIs(load_user(str(user.id)), user)
+        self.assertIsNotNone(user_cache.get(user.id))
+        db.session.remove()
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        sa.event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            user = load_user(str(user.id))
+            self.assertEqual(user.username, "susan")
+        finally:
+            sa.event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+        self.assertEqual(statements, [])
+        user.name = "Susan"
+        db.session.commit()
+        self.assertIsNone(user_cache.get(user.id))
+        db.session.remove()
+        self.assertEqual(load_user(str(user.id)).name, "Susan")
+
+    def test_caches_are_evicted_on_commit(self):
+        user = User(
+            email="susan@example.com", username="susan", password="cat", confirmed=True
+        )
+        db.session.add(user)
+        db.session.commit()
+        token = user.get_api_token()
+        db.session.commit()
+
+        # Another request caches the committed rows before this one commits.
+        user.name = "Susan"
+        user.revoke_token()
+        db.session.flush()
+        user_cache.set(user.id, "stale")
+        token_cache.set(token, "stale")
+        db.session.commit()
+        self.assertIsNone(user_cache.get(user.id))
+        self.assertIsNone(token_cache.get(token))
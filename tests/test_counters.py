@@ -0,0 +1,70 @@
+import unittest
+
+from app import create_app
+from app.extensions import db
+from app.models import Comment, Post, Role, User, follow
+
+
+class CountersTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.susan = User(email="susan@example.com", username="susan", password="cat")
+        self.john = User(email="john@example.com", username="john", password="dog")
+        db.session.add_all([self.susan, self.john])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_posts_and_comments_count(self):
+        post = Post(body="post", author=self.susan)
+        db.session.add(post)
+        db.session.commit()
+        self.assertEqual(self.susan.posts_count, 1)
+        self.assertEqual(post.comments_count, 0)
+        db.session.add_all(
+            [
+                Comment(body="one", post=post, author=self.john),
+                Comment(body="two", post=post, author=self.john),
+            ]
+        )
+        db.session.commit()
+        self.assertEqual(post.comments_count, 2)
+
+    def test_follow_counts(self):
+        self.susan.follow(self.john)
+        db.session.commit()
+        self.assertEqual(self.susan.following_count, 1)
+        self.assertEqual(self.susan.followed_count, 0)
+        self.assertEqual(self.john.followed_count, 1)
+        self.susan.unfollow(self.john)
+        db.session.commit()
+        self.assertEqual(self.susan.following_count, 0)
+        self.assertEqual(self.john.followed_count, 0)
+
+    def test_recount(self):
+        post = Post(body="post", author=self.susan)
+        db.session.add(post)
+        db.session.commit()
+        db.session.execute(
+            follow.insert().values(followed_id=self.susan.id, following_id=self.john.id)
+        )
+        db.session.execute(
+            db.insert(Comment).values(
+                body="c", body_html="c", post_id=post.id, author_id=self.john.id
+            )
+        )
+        db.session.execute(db.update(User).values(posts_count=0))
+        db.session.commit()
+        User.recount(chunk_size=1)
+        Post.recount(chunk_size=1)
+        self.assertEqual(self.susan.posts_count, 1)
+        self.assertEqual(self.susan.following_count, 1)
+        self.assertEqual(self.john.followed_count, 1)
+        self.assertEqual(post.comments_count, 1)
@@ -0,0 +1,55 @@
+import unittest
+
+import sqlalchemy as sa
+
+from app import create_app
+from app.extensions import db
+from app.fake import FakeData
+from app.models import Comment, Permission, Post, Role, User, follow, timeline
+from app.search import matching
+
+
+class FakeDataTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def count(self, table):
+        return db.session.scalar(db.select(sa.func.count()).select_from(table))
+
+    def test_generate(self):
+        data = FakeData(chunk_size=7)
+        data.users(20)
+        data.posts(50)
+        data.follows(3)
+        data.comments(40)
+        data.rebuild()
+        self.assertEqual(self.count(User), 20)
+        self.assertEqual(self.count(Post), 50)
+        self.assertEqual(self.count(Comment), 40)
+        self.assertEqual(
+            db.session.scalar(db.select(sa.func.sum(User.posts_count))), 50
+        )
+        self.assertEqual(
+            db.session.scalar(db.select(sa.func.sum(Post.comments_count))), 40
+        )
+        self.assertEqual(
+            db.session.scalar(db.select(sa.func.sum(User.followed_count))),
+            self.count(follow),
+        )
+        self.assertGreaterEqual(self.count(timeline), 50)
+        user = db.session.scalar(db.select(User))
+        self.assertTrue(user.check_password("123"))
+        self.assertTrue(user.can(Permission.FOLLOW))
+        for model in (Post, Comment):
+            item = db.session.scalar(db.select(model))
+            word = item.body.split()[0].strip(".")
+            self.assertIn(item, db.session.scalars(matching(model, word)).all())
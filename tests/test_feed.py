@@ -0,0 +1,78 @@
+import unittest
+
+import sqlalchemy as sa
+
+from app import create_app
+from app.extensions import db, fragment_cache
+from app.models import Comment, Post, Role, User
+
+
+class FeedTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.client = self.app.test_client(use_cookies=True)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_posts(self, start, stop):
+        for i in range(start, stop):
+            user = User(
+                email=f"user{i}@example.com",
+                username=f"user{i}",
+                password="cat",
+                confirmed=True,
+            )
+            post = Post(body=f"post {i}", author=user)
+            db.session.add_all([user, post, Comment(body="hi", post=post, author=user)])
+        db.session.commit()
+
+    def count_queries(self, url):
+        self.client.get(url)
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        sa.event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            response = self.client.get(url)
+        finally:
+            sa.event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+        self.assertEqual(response.status_code, 200)
+        return len(statements)
+
+    def test_index_query_count_is_constant(self):
+        self.add_posts(0, 2)
+        self.client.post(
+            "/auth/login", data={"email": "user0@example.com", "password": "cat"}
+        )
+        few = self.count_queries("/")
+        self.add_posts(2, 10)
+        self.assertEqual(self.count_queries("/"), few)
+
+    def test_post_fragments(self):
+        self.add_posts(0, 2)
+        self.client.post(
+            "/auth/login", data={"email": "user0@example.com", "password": "cat"}
+        )
+        html = self.client.get("/").get_data(as_text=True)
+        self.assertEqual(html.count(">Edit</span>"), 1)
+        self.assertIsNotNone(fragment_cache.get(("post", 1)))
+        post = db.session.get(Post, 1)
+        post.body = "edited"
+        self.assertIsNone(fragment_cache.get(("post", 1)))
+        db.session.commit()
+        html = self.client.get("/").get_data(as_text=True)
+        self.assertIn("<p>edited</p>", html)
+        self.assertEqual(html.count(">Edit</span>"), 1)
+        self.client.get("/auth/logout")
+        html = self.client.get("/user/user0").get_data(as_text=True)
+        self.assertIn("<p>edited</p>", html)
+        self.assertNotIn(">Edit</span>", html)
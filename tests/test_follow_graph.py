@@ -0,0 +1,201 @@
+import unittest
+from unittest import mock
+
+import sqlalchemy as sa
+
+from app import create_app
+from app.extensions import db, follow_graph
+from app.follow_graph import FollowGraph
+from app.models import Role, User, follow
+
+
+class FollowGraphTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.users = [
+            User(email=f"{name}@example.com", username=name, password="cat")
+            for name in ("susan", "john", "david", "mary", "alex")
+        ]
+        db.session.add_all(self.users)
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_is_following_cached(self):
+        susan, john = self.users[:2]
+        self.assertFalse(susan.is_following_cached(john))
+        susan.follow(john)
+        self.assertTrue(susan.is_following_cached(john))
+        db.session.commit()
+        self.assertTrue(susan.is_following_cached(john))
+        self.assertFalse(john.is_following_cached(susan))
+
+        susan.unfollow(john)
+        db.session.rollback()
+        self.assertTrue(susan.is_following_cached(john))
+        susan.unfollow(john)
+        db.session.commit()
+        self.assertFalse(susan.is_following_cached(john))
+
+    def test_invalidate(self):
+        susan, john = self.users[:2]
+        self.assertFalse(susan.is_following_cached(john))
+        db.session.execute(
+            follow.insert().values(followed_id=susan.id, following_id=john.id)
+        )
+        db.session.commit()
+        self.assertFalse(susan.is_following_cached(john))
+        follow_graph.invalidate()
+        self.assertTrue(susan.is_following_cached(john))
+
+    def test_loaded_at_startup(self):
+        with mock.patch.object(FollowGraph, "load") as load:
+            app = create_app("testing")
+        self.assertIs(app.extensions["follow_graph"].graph, load.return_value)
+        # Without the tables the graph is loaded on first use.
+        self.assertIsNone(create_app("testing").extensions["follow_graph"].graph)
+
+    def test_background_reload(self):
+        susan, john, david = self.users[:3]
+        self.assertFalse(susan.is_following_cached(john))
+        db.session.execute(
+            follow.insert().values(followed_id=susan.id, following_id=john.id)
+        )
+        db.session.commit()
+        self.app.config["FOLLOW_GRAPH_TTL"] = 0
+        # The old graph answers until the new one is loaded.
+        self.assertFalse(susan.is_following_cached(john))
+        state = self.app.extensions["follow_graph"]
+        state.reloader.join(5)
+        self.app.config["FOLLOW_GRAPH_TTL"] = 300
+        self.assertTrue(susan.is_following_cached(john))
+
+        # Commits applied while the new graph loads are replayed onto it.
+        old, stale = state.graph, follow_graph.load()
+        state.reloading = []
+        susan.follow(david)
+        db.session.commit()
+        with mock.patch.object(follow_graph, "load", return_value=stale):
+            follow_graph._reload(self.app, state, old)
+        self.assertIs(state.graph, stale)
+        self.assertTrue(susan.is_following_cached(david))
+
+    def test_writes_ignore_a_stale_graph(self):
+        susan, john = self.users[:2]
+        self.assertFalse(susan.is_following_cached(john))
+
+        # Another process follows, the graph of this one is not told.
+        db.session.execute(
+            follow.insert().values(followed_id=susan.id, following_id=john.id)
+        )
+        db.session.execute(
+            sa.update(User)
+            .where(User.id == susan.id)
+            .values(following_count=User.following_count + 1)
+        )
+        db.session.execute(
+            sa.update(User)
+            .where(User.id == john.id)
+            .values(followed_count=User.followed_count + 1)
+        )
+        db.session.commit()
+        self.assertFalse(susan.is_following_cached(john))
+        self.assertFalse(susan.follow(john))
+        db.session.commit()
+        self.assertEqual((susan.following_count, john.followed_count), (1, 1))
+
+        # And then unfollows.
+        follow_graph.invalidate()
+        self.assertTrue(susan.is_following_cached(john))
+        db.session.execute(follow.delete())
+        db.session.execute(sa.update(User).values(following_count=0, followed_count=0))
+        db.session.commit()
+        self.assertFalse(susan.unfollow(john))
+        db.session.commit()
+        self.assertEqual((susan.following_count, john.followed_count), (0, 0))
+        self.assertFalse(susan.is_following(john))
+
+    def test_one_membership_query_per_write(self):
+        susan, john = self.users[:2]
+        susan.confirmed = True
+        db.session.commit()
+        token = {"token": susan.get_api_token()}
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            if "FROM user, follow" in statement:
+                statements.append(statement)
+
+        sa.event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            for method in ("post", "post", "delete", "delete"):
+                statements.clear()
+                response = getattr(self.client, method)(
+                    f"/api/follow/{john.id}", json=token
+                )
+                self.assertIn(response.status_code, (200, 204))
+                self.assertEqual(len(statements), 1)
+        finally:
+            sa.event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+        self.assertFalse(susan.is_following(john))
+
+    def test_suggestions(self):
+        susan, john, david, mary, alex = self.users
+        susan.follow(john)
+        susan.follow(david)
+        john.follow(mary)
+        david.follow(mary)
+        david.follow(alex)
+        john.follow(susan)
+        db.session.commit()
+        self.assertEqual(susan.suggestions(), [mary, alex])
+        # Without friends of friends, the most followed users come first.
+        self.assertEqual(alex.suggestions(2), [mary, susan])
+
+        # The ranking of the most followed users is kept up to date.
+        alex.follow(susan)
+        mary.follow(susan)
+        david.unfollow(mary)
+        db.session.commit()
+        self.assertEqual(alex.suggestions(2), [john, david])
+        self.assertEqual(susan.suggestions(1), [mary])
+        self.assertEqual(follow_graph.graph.popular, follow_graph.load().popular)
+
+    def test_suggestions_view(self):
+        susan, john, david = self.users[:3]
+        susan.confirmed = True
+        susan.follow(john)
+        john.follow(david)
+        db.session.commit()
+        response = self.client.get("/user/suggestions")
+        self.assertEqual(response.status_code, 302)
+
+        self.client.post(
+            "/auth/login", data={"email": "susan@example.com", "password": "cat"}
+        )
+        response = self.client.get("/user/suggestions")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("/user/follow/david", response.get_data(as_text=True))
+
+    def test_suggestions_api(self):
+        susan, john, david = self.users[:3]
+        susan.confirmed = True
+        susan.follow(john)
+        john.follow(david)
+        db.session.commit()
+        token = {"token": susan.get_api_token()}
+        response = self.client.get(
+            f"/api/users/{susan.id}/suggestions?fields=username", json=token
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["items"][0], {"username": "david"})
+        response = self.client.get("/api/users/100/suggestions", json=token)
+        self.assertEqual(response.status_code, 404)
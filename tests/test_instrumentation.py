@@ -0,0 +1,66 @@
+import re
+import unittest
+
+from flask import g
+
+from app import create_app
+from app.extensions import db, user_cache
+from app.models import Role, User
+
+
+class SQLInstrumentationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        db.session.add(
+            User(email="susan@example.com", username="susan", password="cat")
+        )
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def queries(self, response):
+        match = re.fullmatch(
+            r'db;dur=\d+\.\d;desc="(\d+) queries"', response.headers["Server-Timing"]
+        )
+        self.assertIsNotNone(match)
+        return int(match.group(1))
+
+    def test_server_timing(self):
+        response = self.client.get("/user/susan")
+        self.assertEqual(response.status_code, 200)
+        queries = self.queries(response)
+        self.assertGreater(queries, 0)
+
+        # Queries outside a request are not counted.
+        db.session.scalar(db.select(User))
+        self.assertEqual(self.queries(self.client.get("/user/susan")), queries)
+
+    def test_before_request_queries(self):
+        # Loading the user for an unconfirmed account redirects before the
+        # view runs, but its queries are still counted.
+        self.client.post(
+            "/auth/login", data={"email": "susan@example.com", "password": "cat"}
+        )
+        g.pop("_login_user", None)
+        user_cache.pop(1)
+        response = self.client.get("/user/susan")
+        self.assertEqual(response.status_code, 302)
+        self.assertGreater(self.queries(response), 0)
+
+    def test_slow_query_log(self):
+        self.app.config["SLOW_QUERY_THRESHOLD"] = 0
+        with self.assertLogs("app.instrumentation", "WARNING") as logs:
+            self.client.get("/user/susan")
+        self.assertIn("in user.index: SELECT", logs.output[0])
+
+        self.app.config["SLOW_QUERY_THRESHOLD"] = None
+        with self.assertNoLogs("app.instrumentation", "WARNING"):
+            self.client.get("/user/susan")
@@ -0,0 +1,66 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from time import monotonic, sleep
+
+import sqlalchemy as sa
+
+from app import create_app
+from app.extensions import db, last_seen
+from app.models import Role, User
+
+
+class LastSeenTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.client = self.app.test_client(use_cookies=True)
+        self.user = User(
+            email="susan@example.com",
+            username="susan",
+            password="cat",
+            confirmed=True,
+            last_seen=datetime(2024, 1, 1),
+        )
+        db.session.add(self.user)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_requests_do_not_write(self):
+        self.client.post(
+            "/auth/login", data={"email": "susan@example.com", "password": "cat"}
+        )
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        sa.event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            self.assertEqual(self.client.get("/").status_code, 200)
+        finally:
+            sa.event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+        self.assertFalse(any(s.startswith("UPDATE") for s in statements))
+        last_seen.flush()
+        db.session.expire_all()
+        self.assertGreater(
+            self.user.last_seen.replace(tzinfo=timezone.utc),
+            datetime.now(timezone.utc) - timedelta(minutes=1),
+        )
+
+    def test_background_flush(self):
+        self.app.config["LAST_SEEN_FLUSH_INTERVAL"] = 0
+        last_seen.touch(self.user)
+        deadline = monotonic() + 5
+        while monotonic() < deadline:
+            db.session.rollback()
+            if self.user.last_seen > datetime(2024, 1, 1):
+                break
+            sleep(0.05)
+        self.assertGreater(self.user.last_seen, datetime(2024, 1, 1))
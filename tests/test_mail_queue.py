@@ -0,0 +1,114 @@
+import gc
+import unittest
+import weakref
+from threading import Event, Timer
+
+from flask_mailman import EmailMessage
+from flask_mailman.backends.locmem import EmailBackend
+
+from app import create_app
+from app.extensions import mail_queue
+
+
+class RecordingBackend(EmailBackend):
+    """Record the batches sent on each connection, optionally held open."""
+
+    opened = None
+    release = None
+
+    def open(self):
+        mailman = self.mailman
+        mailman.connections = getattr(mailman, "connections", 0) + 1
+        if self.opened is not None:
+            self.opened.set()
+            self.release.wait(5)
+        return True
+
+    def send_messages(self, messages):
+        self.mailman.batches = getattr(self.mailman, "batches", [])
+        self.mailman.batches.append(len(messages))
+        return super().send_messages(messages)
+
+
+class MailQueueTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app.config.update(MAIL_WORKERS=1, MAIL_QUEUE_TIMEOUT=0.01)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.mailman = self.app.extensions["mailman"]
+        self.mailman.backend = RecordingBackend
+        RecordingBackend.opened, RecordingBackend.release = Event(), Event()
+
+    def tearDown(self):
+        RecordingBackend.release.set()
+        mail_queue.join(timeout=5)
+        self.app_context.pop()
+
+    def message(self, i=0):
+        return EmailMessage(f"message {i}", "body", to=["susan@example.com"])
+
+    def test_batches_share_a_connection(self):
+        self.assertTrue(mail_queue.put(self.message(0)))
+        RecordingBackend.opened.wait(5)
+        for i in range(1, 5):
+            self.assertTrue(mail_queue.put(self.message(i)))
+        RecordingBackend.release.set()
+        self.assertTrue(mail_queue.join(timeout=5))
+        self.assertEqual(self.mailman.connections, 1)
+        self.assertEqual(self.mailman.batches, [1, 4])
+        self.assertEqual(
+            [message.subject for message in self.mailman.outbox],
+            [f"message {i}" for i in range(5)],
+        )
+        metrics = mail_queue.metrics()
+        self.assertEqual(metrics["queued"], 5)
+        self.assertEqual(metrics["sent"], 5)
+        self.assertEqual(metrics["depth"], 0)
+
+    def test_full_queue_rejects(self):
+        self.app.config["MAIL_QUEUE_SIZE"] = 1
+        mail_queue.init_app(self.app)
+        self.assertTrue(mail_queue.put(self.message(0)))
+        RecordingBackend.opened.wait(5)
+        self.assertTrue(mail_queue.put(self.message(1)))
+        with self.assertLogs("app.mail_queue", "WARNING"):
+            self.assertFalse(mail_queue.put(self.message(2)))
+        self.assertFalse(mail_queue.join(timeout=0.05))
+        metrics = mail_queue.metrics()
+        self.assertEqual(
+            (metrics["queued"], metrics["rejected"], metrics["depth"]), (2, 1, 1)
+        )
+        self.assertEqual(metrics["capacity"], 1)
+
+        RecordingBackend.release.set()
+        self.assertTrue(mail_queue.join(timeout=5))
+        self.assertEqual(mail_queue.metrics()["sent"], 2)
+
+    def test_drain_at_exit(self):
+        mail_queue.put(self.message(0))
+        RecordingBackend.opened.wait(5)
+        mail_queue.put(self.message(1))
+        self.app.config["MAIL_QUEUE_TIMEOUT"] = 5
+        Timer(0.1, RecordingBackend.release.set).start()
+        mail_queue._drain()
+        self.assertEqual(len(self.mailman.outbox), 2)
+
+    def test_apps_are_not_kept_alive(self):
+        app = weakref.ref(create_app("testing"))
+        gc.collect()
+        self.assertIsNone(app())
+
+    def test_workers_let_their_app_go(self):
+        app = create_app("testing")
+        app.config.update(MAIL_WORKERS=1, MAIL_IDLE_TIMEOUT=0.01)
+        with app.app_context():
+            self.assertTrue(mail_queue.put(self.message()))
+            self.assertTrue(mail_queue.join(timeout=5))
+            self.assertEqual(len(app.extensions["mailman"].outbox), 1)
+            (worker,) = mail_queue.state.workers
+        app = weakref.ref(app)
+        gc.collect()
+        self.assertIsNone(app())
+        worker.join(5)
+        self.assertFalse(worker.is_alive())
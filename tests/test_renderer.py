@@ -0,0 +1,20 @@
+import unittest
+
+from app.renderer import COMMENT_TAGS, POST_TAGS, render, render_many, render_pool
+
+
+class RendererTestCase(unittest.TestCase):
+    def test_render(self):
+        self.assertEqual(
+            render("body of the *blog* post", POST_TAGS),
+            "<p>body of the <em>blog</em> post</p>",
+        )
+        self.assertEqual(render("# title", COMMENT_TAGS), "title")
+        self.assertEqual(render("# title", POST_TAGS), "<h1>title</h1>")
+
+    def test_render_many(self):
+        bodies = [f"post *{i}*" for i in range(20)]
+        expected = [render(body, POST_TAGS) for body in bodies]
+        self.assertEqual(render_many(bodies, POST_TAGS), expected)
+        with render_pool(2) as executor:
+            self.assertEqual(render_many(bodies, POST_TAGS, executor), expected)
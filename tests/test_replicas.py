@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from flask import g
+
+from app import create_app
+from app.config import TestingConfig, config
+from app.extensions import db
+from app.models import Post, Role, User
+
+
+class ReplicaTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        primary = os.path.join(self.tmpdir, "primary.sqlite")
+        self.replica = os.path.join(self.tmpdir, "replica.sqlite")
+
+        class ReplicaConfig(TestingConfig):
+            SQLALCHEMY_DATABASE_URI = "sqlite:///" + primary
+            SQLALCHEMY_REPLICAS = ["sqlite:///" + self.replica]
+
+        with mock.patch.dict(config, {"replica": ReplicaConfig}):
+            self.app = create_app("replica")
+        self.client = self.app.test_client(use_cookies=True)
+        with self.app.app_context():
+            db.create_all()
+            Role.insert_roles()
+            user = User(
+                email="susan@example.com",
+                username="susan",
+                password="cat",
+                confirmed=True,
+            )
+            db.session.add(Post(body="old post", author=user))
+            db.session.commit()
+            shutil.copy(primary, self.replica)
+            db.session.add(Post(body="new post", author=user))
+            db.session.commit()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.engine.dispose()
+        for engine in self.app.extensions["replicas"]:
+            engine.dispose()
+        shutil.rmtree(self.tmpdir)
+
+    def test_reads_go_to_replica_until_a_write(self):
+        html = self.client.get("/user/susan").get_data(as_text=True)
+        self.assertIn("old post", html)
+        self.assertNotIn("new post", html)
+        self.client.post(
+            "/auth/login", data={"email": "susan@example.com", "password": "cat"}
+        )
+        response = self.client.post("/", data={"body": "another post"})
+        self.assertEqual(response.status_code, 302)
+        html = self.client.get("/user/susan").get_data(as_text=True)
+        self.assertIn("new post", html)
+        self.assertIn("another post", html)
+
+    def test_api_writes_pin_the_user(self):
+        with self.app.app_context():
+            token = {"token": db.session.get(User, 1).get_api_token()}
+        client = self.app.test_client(use_cookies=False)
+        bodies = [
+            item["body"]
+            for item in client.get("/api/posts", json=token).get_json()["posts"]
+        ]
+        self.assertEqual(bodies, ["old post"])
+        response = client.post("/api/posts", json=dict(token, body="api post"))
+        self.assertEqual(response.status_code, 201)
+        bodies = [
+            item["body"]
+            for item in client.get("/api/posts", json=token).get_json()["posts"]
+        ]
+        self.assertIn("api post", bodies)
+        self.assertIn("new post", bodies)
+
+    def test_api_writes_pin_html_reads(self):
+        self.client.post(
+            "/auth/login", data={"email": "susan@example.com", "password": "cat"}
+        )
+        with self.client.session_transaction() as session:
+            session.pop("primary_until", None)
+        html = self.client.get("/user/susan").get_data(as_text=True)
+        self.assertNotIn("new post", html)
+
+        with self.app.app_context():
+            token = {"token": db.session.get(User, 1).get_api_token()}
+        api_client = self.app.test_client(use_cookies=False)
+        response = api_client.post("/api/posts", json=dict(token, body="api post"))
+        self.assertEqual(response.status_code, 201)
+        html = self.client.get("/user/susan").get_data(as_text=True)
+        self.assertIn("new post", html)
+        self.assertIn("api post", html)
+
+    def test_caches_load_from_primary(self):
+        with self.app.app_context():
+            john = User(email="john@example.com", username="john", password="dog")
+            db.session.add(john)
+            db.session.commit()
+            john_id = john.id
+        with self.app.test_request_context("/"):
+            self.app.preprocess_request()
+            self.assertIsNotNone(g.replica)
+            self.assertEqual(User.cached(john_id).username, "john")
@@ -0,0 +1,81 @@
+import unittest
+
+import sqlalchemy as sa
+
+from app import create_app
+from app.extensions import db
+from app.models import Permission, Role, User
+
+
+class RoleCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_permission_checks_skip_database(self):
+        user = User(email="susan@example.com", username="susan", password="cat")
+        admin = User(
+            email=self.app.config["ADMIN_EMAIL"], username="frank", password="cat"
+        )
+        db.session.add_all([user, admin])
+        db.session.commit()
+        user, admin = db.session.get(User, user.id), db.session.get(User, admin.id)
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        sa.event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            self.assertTrue(user.can(Permission.WRITE))
+            self.assertFalse(user.is_admin())
+            self.assertTrue(admin.is_admin())
+        finally:
+            sa.event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+        self.assertEqual(statements, [])
+
+    def test_role_change_refreshes_cache(self):
+        user = User(email="susan@example.com", username="susan", password="cat")
+        db.session.add(user)
+        db.session.commit()
+        self.assertFalse(user.can(Permission.MODERATE))
+        role = db.session.scalar(db.select(Role).filter_by(name="User"))
+        role.add_permission(Permission.MODERATE)
+        db.session.commit()
+        self.assertTrue(user.can(Permission.MODERATE))
+        Role.insert_roles()
+        self.assertFalse(user.can(Permission.MODERATE))
+
+    def test_uncommitted_changes_are_not_cached(self):
+        user = User(email="susan@example.com", username="susan", password="cat")
+        db.session.add(user)
+        db.session.commit()
+        role = db.session.scalar(db.select(Role).filter_by(name="User"))
+        role.add_permission(Permission.MODERATE)
+        db.session.flush()
+        self.assertFalse(user.can(Permission.MODERATE))
+        db.session.rollback()
+        self.assertFalse(user.can(Permission.MODERATE))
+
+    def test_changes_from_other_processes_expire(self):
+        user = User(email="susan@example.com", username="susan", password="cat")
+        db.session.add(user)
+        db.session.commit()
+        self.assertFalse(user.can(Permission.MODERATE))
+        with db.engine.begin() as connection:
+            connection.execute(
+                sa.update(Role)
+                .where(Role.name == "User")
+                .values(permissions=Role.permissions + Permission.MODERATE)
+            )
+        self.assertFalse(user.can(Permission.MODERATE))
+        self.app.config["ROLE_CACHE_TTL"] = 0
+        self.assertTrue(user.can(Permission.MODERATE))
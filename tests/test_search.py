@@ -0,0 +1,70 @@
+import unittest
+
+from app import create_app
+from app.extensions import db
+from app.models import Comment, Post, Role, User
+from app.search import matching, rebuild
+
+
+class SearchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.client = self.app.test_client()
+        self.user = User(
+            email="susan@example.com", username="susan", password="cat", confirmed=True
+        )
+        self.posts = [
+            Post(body="The quick brown fox", author=self.user),
+            Post(body="A lazy dog, and a fox and another fox", author=self.user),
+            Post(body="Nothing to see here", author=self.user),
+        ]
+        db.session.add_all(self.posts)
+        db.session.add(
+            Comment(body="What does the fox say?", post=self.posts[2], author=self.user)
+        )
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def search(self, model, text):
+        return [item.id for item in db.session.scalars(matching(model, text))]
+
+    def test_index_follows_writes(self):
+        self.assertEqual(self.search(Post, "foxes"), [2, 1])
+        self.assertEqual(self.search(Post, 'fox "OR'), [])
+        self.posts[0].body = "The quick brown cat"
+        db.session.commit()
+        self.assertEqual(self.search(Post, "fox"), [2])
+        self.assertEqual(self.search(Comment, "fox"), [1])
+        rebuild(chunk_size=1)
+        self.assertEqual(self.search(Post, "fox"), [2])
+        self.assertEqual(self.search(Comment, "fox"), [1])
+
+    def test_search_page(self):
+        html = self.client.get("/search?q=fox").get_data(as_text=True)
+        self.assertIn("A lazy dog", html)
+        self.assertNotIn("Nothing to see here", html)
+        html = self.client.get("/search?q=fox&kind=comments").get_data(as_text=True)
+        self.assertIn("What does the fox say?", html)
+        self.assertIn("/post/3#comments", html)
+
+    def test_search_api(self):
+        response = self.client.get(
+            "/api/search?q=fox", json={"token": self.user.get_api_token()}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["_meta"]["total_items"], 2)
+        self.assertEqual(
+            response.json["items"][0]["body"], "A lazy dog, and a fox and another fox"
+        )
+        response = self.client.get(
+            "/api/search", json={"token": self.user.get_api_token()}
+        )
+        self.assertEqual(response.status_code, 400)
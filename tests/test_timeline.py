@@ -0,0 +1,154 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from app import create_app
+from app.extensions import db
+from app.models import Post, Role, User, timeline
+from app.pagination import CursorPagination
+
+
+class TimelineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.susan = User(email="susan@example.com", username="susan", password="cat")
+        self.john = User(email="john@example.com", username="john", password="dog")
+        self.david = User(email="david@example.com", username="david", password="dog")
+        db.session.add_all([self.susan, self.john, self.david])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def following_posts(self, user):
+        query = user.following_posts.order_by(Post.timestamp.desc())
+        return [post.body for post in db.session.scalars(query)]
+
+    def test_fanout_on_write(self):
+        db.session.add(Post(body="before", author=self.john))
+        db.session.commit()
+        self.susan.follow(self.john)
+        db.session.commit()
+        db.session.add_all(
+            [
+                Post(body="own", author=self.susan),
+                Post(body="after", author=self.john),
+                Post(body="stranger", author=self.david),
+            ]
+        )
+        db.session.commit()
+        self.assertEqual(self.following_posts(self.susan), ["after", "own", "before"])
+        self.susan.unfollow(self.john)
+        db.session.commit()
+        self.assertEqual(self.following_posts(self.susan), ["own"])
+
+    def test_fanout_on_read(self):
+        self.app.config["TIMELINE_FANOUT_LIMIT"] = 1
+        self.susan.follow(self.john)
+        db.session.commit()
+        db.session.add(Post(body="popular", author=self.john))
+        db.session.commit()
+        self.assertEqual(
+            db.session.scalar(
+                db.select(db.func.count()).where(timeline.c.user_id == self.susan.id)
+            ),
+            0,
+        )
+        self.assertEqual(self.following_posts(self.susan), ["popular"])
+
+    def test_rebuild(self):
+        self.susan.follow(self.john)
+        db.session.add_all(
+            [Post(body="own", author=self.susan), Post(body="john", author=self.john)]
+        )
+        db.session.commit()
+        db.session.execute(timeline.delete())
+        db.session.commit()
+        User.rebuild_timelines(chunk_size=1)
+        self.assertEqual(sorted(self.following_posts(self.susan)), ["john", "own"])
+        self.assertEqual(self.following_posts(self.john), ["john"])
+
+    def test_trim(self):
+        self.app.config["TIMELINE_LENGTH"] = 2
+        self.app.config["TIMELINE_TRIM_INTERVAL"] = 1
+        now = datetime.now(timezone.utc)
+        db.session.add_all(
+            [
+                Post(body=f"john {i}", author=self.john, timestamp=now + timedelta(i))
+                for i in range(3)
+            ]
+        )
+        db.session.commit()
+        self.assertEqual(self.following_posts(self.john), ["john 2", "john 1"])
+        self.susan.follow(self.john)
+        db.session.commit()
+        self.assertEqual(self.following_posts(self.susan), ["john 2", "john 1"])
+        db.session.add(
+            Post(body="john 3", author=self.john, timestamp=now + timedelta(3))
+        )
+        db.session.commit()
+        self.assertEqual(self.following_posts(self.susan), ["john 3", "john 2"])
+
+    def test_trim_interval(self):
+        # Post ids alternate between trimming susan's and david's timelines
+        # (odd ids) and john's (even ids).
+        self.app.config["TIMELINE_LENGTH"] = 1
+        self.app.config["TIMELINE_TRIM_INTERVAL"] = 2
+        self.susan.follow(self.john)
+        self.david.follow(self.john)
+        db.session.commit()
+        now = datetime.now(timezone.utc)
+        lengths = []
+        for i in range(3):
+            db.session.add(
+                Post(body=f"john {i}", author=self.john, timestamp=now + timedelta(i))
+            )
+            db.session.commit()
+            lengths.append(
+                [
+                    len(self.following_posts(user))
+                    for user in (self.susan, self.john, self.david)
+                ]
+            )
+        self.assertEqual(lengths, [[1, 1, 1], [2, 1, 2], [1, 2, 1]])
+
+    def test_popular_authors_are_limited(self):
+        self.app.config["TIMELINE_FANOUT_LIMIT"] = 1
+        self.app.config["TIMELINE_LENGTH"] = 2
+        self.susan.follow(self.john)
+        db.session.commit()
+        now = datetime.now(timezone.utc)
+        db.session.add_all(
+            [
+                Post(body=f"john {i}", author=self.john, timestamp=now + timedelta(i))
+                for i in range(3)
+            ]
+        )
+        db.session.add(Post(body="own", author=self.susan, timestamp=now))
+        db.session.commit()
+        self.assertEqual(self.following_posts(self.susan), ["john 2", "john 1", "own"])
+
+    def test_keyset_pages(self):
+        self.susan.follow(self.john)
+        now = datetime.now(timezone.utc)
+        db.session.add_all(
+            [
+                Post(body=f"post {i}", author=self.john, timestamp=now + timedelta(i))
+                for i in range(5)
+            ]
+        )
+        db.session.commit()
+        home = self.susan.home_timeline()
+        bodies, cursor = [], ""
+        while cursor is not None:
+            page = CursorPagination(
+                home.query, home.columns, cursor, 2, keys=["timestamp", "id"]
+            )
+            bodies += [post.body for post in page]
+            cursor = page.next_cursor
+        self.assertEqual(bodies, [f"post {i}" for i in reversed(range(5))])